@@ -1,5 +1,9 @@
+import webbrowser
 from tkinter.messagebox import showinfo, showerror
 
+import numpy as np
+from matplotlib.colors import LinearSegmentedColormap
+
 
 def warn_no_video():
     showinfo(title='No video',
@@ -21,13 +25,29 @@ def warn_empty_cache():
              message='The list of previously analysed files is empty')
 
 
-def warn_no_swe_data():
-    showinfo(title='No SWE data',
-             message='No elastography data were found in the current selection.'
-                     ' Programme is closing.')
+def warn_no_swe_data(roi_name=None, analysed_rois=()):
+    """Warn that a ROI contains no elastography data
+    Args:
+        roi_name (str): name of the ROI, None if unnamed
+        analysed_rois (list): names of the ROIs analysed before, whose results are kept
+    """
+    message = f'No elastography data were found in {roi_name or "the current selection"}.'
+    if analysed_rois:
+        message += f' Results of {", ".join(analysed_rois)} were kept.'
+    showinfo(title='No SWE data', message=message + ' Please check the ROI position.')
+
+
+def warn_missing_results():
+    showinfo(title='Missing results',
+             message='The results of this analysis were deleted from the cache. Please analyse the file again')
+
 
+def warn_no_swe_fhz():
+    showerror(title='No SWE frequency',
+              message='Changes of SWE data could not be found in the frames. Please inform the SWE frequency field')
 
-def log_entry(name, string_var, ttk_table, row_id, var_type=float):
+
+def log_entry(name, string_var, ttk_table, row_id, var_type=float, idx=4):
     """Save entry from tkinter entry to ttk.TreeView instance
     Args:
         name (str):
@@ -35,13 +55,13 @@ def log_entry(name, string_var, ttk_table, row_id, var_type=float):
         ttk_table: ttk.TreeView instance
         row_id (str): iid parameter of created row
         var_type (type): desired type of variable to log in
+        idx (int): index of created row, after the 4 pre-existing rows (0:3) by default
     Returns: variable inserted in ttk.TreeView instance
     """
     if len(string_var.get()) == 0:
         value = None
     elif var_type(string_var.get()) >= 0:
         value = var_type(string_var.get())
-        idx = 5 if isinstance(value, int) else 4  # with 4 pre-existing rows (0:3)
     else:
         warn_wrong_entry()
         return
@@ -63,3 +83,26 @@ def set_win_geometry(container, width, height):
     center_x = int(screen_width / 2 - width / 2)
     center_y = int(screen_height / 3 - height / 3)
     container.geometry(f'{width}x{height}+{center_x}+{center_y}')
+
+
+def callback(url):
+    """open webpage"""
+    webbrowser.open_new(url)
+
+
+def stretch_colormap(cmap, n=255):
+    """Interpolate color map to n colors
+
+    Args:
+        cmap: color map to interpolate
+        n: number of colours in the interpolated color map
+
+    Returns:
+        the interpolated color map
+
+    Notes:
+        adapted from https://stackoverflow.com/a/67985432/13147488
+    """
+    cmap_object = LinearSegmentedColormap.from_list('', np.array(cmap) / 255, 256)
+    cmap_interpolated = (cmap_object(np.linspace(0, 1, n)) * 255).astype(np.uint8)
+    return cmap_interpolated[:, :3]
@@ -0,0 +1,101 @@
+import queue
+import threading
+import tkinter as tk
+from collections import OrderedDict
+
+from PIL import Image, ImageTk
+
+
+class FrameRenderer:
+    """Display frames on a canvas with a single image item, whose PhotoImage is updated in place.
+
+    Frames following the displayed one (in the direction of the last move) are read, i.e. decoded if needed, and
+    converted to PIL images in a background thread, so that the Tk thread only pastes them in the PhotoImage.
+    """
+
+    def __init__(self, canvas, n_ahead=8, cache_size=32):
+        self.canvas = canvas
+        self.n_ahead = n_ahead
+        self.cache_size = cache_size
+        self.frames = None
+        self.photo = None
+        self.item = None
+        self.current = None
+        self.generation = 0  # changes with the displayed frames, so that images of previous frames are discarded
+        self.images = OrderedDict()  # frame index: PIL image, most recently used last
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self.prefetch, daemon=True)
+        self.thread.start()
+
+    def set_frames(self, frames):
+        """Set the array-like of (rows, columns, 3) frames to display, e.g. DcmData.img_array, swe_array or
+        ProxyFrames"""
+        with self.lock:
+            self.frames = frames
+            self.generation += 1
+            self.images.clear()
+        self.current = None
+
+    def close(self):
+        """Stop the prefetch thread, e.g. when the view of the renderer is replaced by that of another file"""
+        with self.lock:
+            self.frames = None
+            self.generation += 1
+            self.images.clear()
+        self.requests.put(None)
+
+    def convert(self, frames, index):
+        return Image.fromarray(frames[index])
+
+    def get_image(self, index):
+        with self.lock:
+            image = self.images.get(index)
+            if image is not None:
+                self.images.move_to_end(index)
+                return image
+            frames = self.frames
+        return self.convert(frames, index)  # not prefetched yet
+
+    def show(self, index):
+        """Display a frame and prefetch the next ones"""
+        if self.frames is None:
+            return
+        image = self.get_image(index)
+        if self.photo is None or (self.photo.width(), self.photo.height()) != image.size:
+            self.photo = ImageTk.PhotoImage(image=image)
+            if self.item is None:
+                self.item = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+                self.canvas.tag_lower(self.item)  # below ROIs
+            else:
+                self.canvas.itemconfig(self.item, image=self.photo)
+        else:
+            self.photo.paste(image)  # in place, without new Tk image or canvas item
+        step = -1 if self.current is not None and index < self.current else 1
+        self.current = index
+        self.requests.put((self.generation, [index + step * i for i in range(1, self.n_ahead + 1)]))
+
+    def prefetch(self):
+        while True:
+            request = self.requests.get()
+            while request is not None and not self.requests.empty():  # only the latest request matters
+                request = self.requests.get()
+            if request is None:  # closed
+                return
+            generation, indices = request
+            for index in indices:
+                with self.lock:
+                    if generation != self.generation or index in self.images:
+                        continue
+                    frames = self.frames
+                if frames is None or index < 0 or index >= len(frames):
+                    continue
+                if not self.requests.empty():
+                    break  # the displayed frame changed meanwhile
+                image = self.convert(frames, index)
+                with self.lock:
+                    if generation != self.generation:
+                        break
+                    self.images[index] = image
+                    while len(self.images) > self.cache_size:
+                        self.images.popitem(last=False)
@@ -1,14 +1,13 @@
 import tkinter as tk
-from pathlib import Path
+from functools import partial
 from tkinter import ttk
 
-from swepy.app import app_utils
-from swepy.app.output_frames import FilesPanel, HistoryPanel, SavePanel, FigPanel
+from swepy.app import app_utils, tasks
+from swepy.app.output_frames import FilesPanel, HistoryPanel, SavePanel, QueuePanel, FigPanel
 from swepy.app.root_widgets import MenuBar
 from swepy.app.view_frames import ImgPanel, TopPanel, LeftPanel
-from swepy.processing import data_utils
-from swepy.processing.data import DcmData
-from swepy.processing.io import pickle_io
+from swepy.processing import catalogue, data_utils, results_store, settings, swe_frames
+from swepy.processing.data import DcmData, NoSweDataError
 
 
 class View(ttk.Frame):
@@ -30,6 +29,8 @@ class View(ttk.Frame):
         self.set_swe_var()
         self.cmap_loc_var = tk.StringVar()
         self.set_cmap_loc()
+        self.sat_thresh_var = tk.IntVar()
+        self.set_sat_thresh()
 
         self.controller = None
 
@@ -49,19 +50,27 @@ class View(ttk.Frame):
         self.left_panel.analyse_btn['command'] = self.process
 
     def set_swe_var(self):
-        swe_var = data_utils.get_settings('SWE_VAR')
+        swe_var = settings.get_settings('SWE_VAR')
         if swe_var:
             self.swe_var.set(swe_var[0])
         else:
             self.swe_var.set('youngs_m')  # set default SWE variable to Young's modulus
 
     def set_cmap_loc(self):
-        cmap_loc = data_utils.get_settings('CMAP_LOC')
+        cmap_loc = settings.get_settings('CMAP_LOC')
         if cmap_loc:
             self.cmap_loc_var.set(cmap_loc[0])
         else:
             self.cmap_loc_var.set('local_cmap')  # set default choice to cmap in image
 
+    def set_sat_thresh(self):
+        """Set % of max scale above which pixels are considered saturated"""
+        sat_thresh = settings.get_settings('SAT_THRESH')
+        if sat_thresh:
+            self.sat_thresh_var.set(sat_thresh[0])
+        else:
+            self.sat_thresh_var.set(98)  # set default value to 98%
+
     def set_controller(self, controller):
         self.controller = controller
 
@@ -73,16 +82,29 @@ class View(ttk.Frame):
 
     def process(self):
         """Check requirements and launch analysis"""
-        if not all([self.swe_fhz, self.max_scale]):
+        if not self.max_scale or self.controller.data.swe_array is None:  # SWE fhz is estimated if not entered
             app_utils.warn_wrong_entry()
             return
         if self.ds:
-            self.controller.analyse()
-            self.block.set(False)
+            if self.controller.analyse():
+                self.block.set(False)
         else:
             app_utils.warn_no_video()
             return
 
+    def batch_params(self):
+        """Parameters of the current analysis, applied to the files of the batch queue"""
+        if self.img_panel.named_rois:
+            rois = dict(self.img_panel.named_rois)
+        else:
+            rois = {None: self.controller.data.results['roi_coords']}  # detected or user drawn ROI
+        return {'swe_fhz': self.swe_fhz,
+                'max_scale': self.max_scale,
+                'swe_var': self.swe_var.get(),
+                'cmap_loc': self.cmap_loc_var.get(),
+                'sat_thresh': self.sat_thresh_var.get(),
+                'rois': rois}
+
     def get_usr_entry(self):
         """Log user entry, re-sample video and save to JSON file"""
         if self.ds:
@@ -94,24 +116,50 @@ class View(ttk.Frame):
                                                  self.left_panel.usr_scale,
                                                  self.left_panel.tv,
                                                  'scale_row',
-                                                 var_type=int)
-            if isinstance(self.swe_fhz, (int, float)):
-                self.get_swe_frames()
-                data_utils.save_usr_input(self.swe_fhz, self.max_scale)
-                data_utils.save_swe_var(self.swe_var.get())
+                                                 idx=5)  # float, as labels of colour bars may be decimal
+            if self.get_swe_frames():
+                settings.save_usr_input(self.swe_fhz, self.max_scale)
+                settings.save_swe_var(self.swe_var.get())
             self.canvas.focus_set()
         else:
             app_utils.warn_no_video()
             return
 
     def get_swe_frames(self):
-        """Set GUI to display and analyse SWE unique scans only"""
-        self.img_panel.swe_array = self.controller.get_swe_array(self.swe_fhz)
+        """Set GUI to display and analyse SWE unique scans only
+        Returns: True if SWE frames were found
+        """
+        try:
+            self.img_panel.swe_array = self.controller.get_swe_array(self.swe_fhz)
+        except NoSweDataError:
+            app_utils.warn_no_swe_fhz()
+            return False
+        except tasks.TaskCancelled:
+            return False
+        finally:
+            self.show_detected_swe_fhz()
         self.img_panel.current_array = self.img_panel.swe_array
         self.img_panel.ctrl.current_value.set(0)
         self.img_panel.activate_slider(self.img_panel.swe_array.shape[0])
         self.img_panel.ctrl.current_frame = 0
+        data = self.controller.data
+        self.img_panel.ctrl.set_frame_rate(data.detected_swe_fhz or data.swe_fhz or data.bmode_fhz)
         self.img_panel.ctrl.update_frame()
+        return True
+
+    def show_detected_swe_fhz(self):
+        """Display frequency of SWE updates estimated from frames and its confidence"""
+        data = self.controller.data
+        row_id = 'detected_swe_row'
+        if row_id in self.left_panel.tv.get_children():
+            self.left_panel.tv.delete(row_id)
+        if data.detected_swe_fhz:
+            value = f'{data.detected_swe_fhz:.2f} (confidence: {data.swe_fhz_confidence:.0%})'
+            if data.swe_fhz_confidence < swe_frames.LOW_CONFIDENCE:
+                value += ', check'
+        else:
+            value = 'not found'
+        self.left_panel.tv.insert(parent='', index=tk.END, iid=row_id, values=('Estimated SWE fhz', value))
 
     def update_dcm_info(self):
         """Populate table with info from DICOM header and json file"""
@@ -140,6 +188,7 @@ class View(ttk.Frame):
         self.img_panel.fov_coords = self.fov_coords
         self.img_panel.roi_coords = self.init_roi_coords
         self.img_panel.current_array = self.img_array
+        self.img_panel.ctrl.set_frame_rate(self.controller.data.bmode_fhz)
         self.img_panel.ctrl.update_frame()
         self.img_panel.activate_slider(self.ds.NumberOfFrames)
         self.img_panel.activate_draw()
@@ -156,19 +205,65 @@ class Controller:
         self.view = view
         self.output = output
 
-    def get_dicom_data(self):
-        """Load DICOM data in View frame"""
+    def run_task(self, message, func, *args):
+        """Run a data method in a worker thread, showing the progress of processed frames (see tasks.BackgroundTask)
+        Raises: tasks.TaskCancelled if the user cancelled the task
+        """
+        def work(progress):
+            self.data.progress = progress
+            try:
+                return func(*args)
+            finally:
+                self.data.progress = None
+
+        return tasks.run_task(self.view, message, work)
+
+    def load_dicom(self):
         self.data.load_dicom()
+        self.data.locate_colour_bar(read_label=True)
+
+    def get_dicom_data(self):
+        """Load DICOM data in a worker thread, then in View frame
+        Raises: tasks.TaskCancelled if loading was cancelled
+        """
+        self.run_task('DICOM file loading', self.load_dicom)
         self.view.ds = self.data.ds
         self.view.img_array = self.data.img_array
         self.view.img_name = self.data.img_name
         self.view.fov_coords = self.data.top_fov_coords
         self.view.init_roi_coords = self.data.roi_coords
+        if self.data.detected_max_scale:
+            self.view.left_panel.usr_scale.set(f'{self.data.detected_max_scale:g}')
         self.view.load_file()
 
     def get_swe_array(self, swe_fhz):
-        """Call method to get array of SWE unique scans"""
-        return self.data.resample(swe_fhz)
+        """Get array of SWE unique scans and map their colours, in a worker thread
+        Raises: tasks.TaskCancelled if the user cancelled the task
+        """
+        map_colours = self.set_colour_scale()
+        return self.run_task('Finding SWE frames', self.resample, swe_fhz, map_colours)
+
+    def resample(self, swe_fhz, map_colours):
+        swe_array = self.data.resample(swe_fhz)
+        if map_colours:
+            self.data.update_swe_map()
+        return swe_array
+
+    def set_colour_scale(self):
+        """Set colour scale from user entries, to map colours of the SWE box of resampled frames for fast analyses
+        of any ROI and live ROI readout
+        Returns: True if the colour scale is set
+        """
+        if not isinstance(self.view.max_scale, (int, float)):
+            return False
+        self.data.max_scale = self.view.max_scale
+        self.data.analysis_swe_var = self.view.swe_var.get()
+        self.data.set_colour_scale(self.view.cmap_loc_var.get())
+        return True
+
+    def roi_summary(self, roi_coords):
+        """Median and mean of the SWE variable in a ROI, None if not available"""
+        return self.data.roi_summary(roi_coords)
 
     def set_swe_variable(self):
         """Set chosen SWE variable for analysis and plotting"""
@@ -176,17 +271,67 @@ class Controller:
         self.output.fig_panel.plot_swe_var.set(self.view.swe_var.get())
 
     def analyse(self):
-        """Get data and call methods for analysis and preview"""
+        """Get data and call methods for analysis (in a worker thread) and preview
+        Returns: True if the analysis was completed
+        """
         self.data.swe_fhz = self.view.swe_fhz
         self.data.max_scale = self.view.max_scale
         self.set_swe_variable()
-        self.view.img_panel.get_top_coords()
-        self.data.roi_coords = self.view.img_panel.roi_coords
-        self.data.analyse_roi(cmap_loc=self.view.cmap_loc_var.get())
-        self.output.results = self.data.results
-        self.output.fig_panel.change_plot()
-        self.output.update_tv(self.data.path)
-        data_utils.pickle_results(self.data.path, self.data.results)
+        img_panel = self.view.img_panel
+        if img_panel.named_rois:
+            rois = img_panel.named_rois
+        else:
+            img_panel.get_top_coords()
+            rois = {None: img_panel.roi_coords}
+        keys = {}  # ROI name: key of stored results, kept if a later ROI cannot be analysed
+        try:
+            self.run_task('Analysing', self.analyse_rois, rois, self.view.cmap_loc_var.get(),
+                          self.view.sat_thresh_var.get(), keys)
+        except NoSweDataError:
+            app_utils.warn_no_swe_data(self.data.roi_name, list(keys))
+            if keys:
+                self.output.add_results(list(keys.values()), self.data.results)
+            return False
+        except tasks.TaskCancelled:
+            return False
+        self.output.add_results(list(keys.values()), self.data.results)
+        return True
+
+    def analyse_rois(self, rois, cmap_loc, sat_thresh, keys):
+        """Analyse ROIs, adding the key of the stored results of each ROI to keys once analysed"""
+        for name, key in self.data.analyse_rois(rois, cmap_loc, sat_thresh=sat_thresh):
+            keys[name] = key
+
+
+def prepare_batch_file(path, progress, params):
+    """Load a file of the batch queue and find its SWE frames, decoding them (see tasks.BatchQueue)
+    Args:
+        path (pathlib.Path): path to DICOM file
+        progress: function (done, total) notified of processed frames
+        params (dict): analysis parameters, see View.batch_params
+    Returns: DcmData instance
+    """
+    data = DcmData(path)
+    data.progress = progress
+    data.load_dicom()
+    data.locate_colour_bar(read_label=True)
+    data.resample(params['swe_fhz'])
+    return data
+
+
+def analyse_batch_file(data, progress, params):
+    """Analyse the ROIs of a prepared file of the batch queue, with the max. scale entered by the user, or read from
+    the colour bar of the file if none was entered
+    Returns: keys of the stored results and results of the last ROI, and warnings (see DcmData.check_estimates)
+    """
+    data.progress = progress
+    data.max_scale = params['max_scale'] or data.detected_max_scale
+    if not data.max_scale:
+        raise ValueError('max. scale could not be read from the colour bar')
+    data.analysis_swe_var = params['swe_var']
+    keys = [key for _, key in data.analyse_rois(params['rois'], params['cmap_loc'], sat_thresh=params['sat_thresh'])]
+    data.progress = None
+    return (keys, data.results), data.check_estimates()
 
 
 class Output(ttk.Frame):
@@ -211,9 +356,12 @@ class Output(ttk.Frame):
         self.previous = HistoryPanel(self)
         self.previous.load_btn['command'] = self.load_previous
         self.previous.clear_all_btn['command'] = self.clear_results
+        self.previous.filter_entry.bind('<Return>', lambda e: self.load_previous())
 
         self.save_panel = SavePanel(self)
 
+        self.queue_panel = QueuePanel(self)
+
         self.fig_panel = FigPanel(self)
 
     # def add_scrollbars(self, container):
@@ -223,37 +371,60 @@ class Output(ttk.Frame):
     #     sb_x.grid(row=1, column=0, sticky='ew')
     #     sb_y.grid(row=0, column=1, sticky='ns')
 
-    def update_tv(self, path):
-        """Add file name and path to list of analysed files"""
-        self.tv_files.append((path.name, path.resolve().parent))
-        if path.name in self.files_panel.tv.get_children():
-            self.files_panel.tv.delete(path.name)
-        self.files_panel.tv.insert('', tk.END, values=self.tv_files[-1], iid=path.name)
+    def update_tv(self, key):
+        """Add file name, path and summary values to list of analysed files
+        Args:
+            key (str): key of the stored results, used as row id
+        Returns: None
+        """
+        row = catalogue.get(key)
+        if row is None:  # catalogue cleared meanwhile
+            return
+        self.tv_files.append(row)
+        self.files_panel.insert_row(row)
         self.files_panel.tv.focus(self.files_panel.tv.get_children()[-1])
 
+    def add_results(self, keys, results):
+        """List analysed ROIs and preview the results of the last one
+        Args:
+            keys (list): keys of the stored results
+            results (SweResults): results to preview
+        Returns: None
+        """
+        for key in keys:
+            self.update_tv(key)
+        self.results = results
+        self.fig_panel.change_plot()
+
     def update_tv_selection(self, event):
         """Update list of selected rows in list of analysed files"""
         self.tv_selection.clear()
-        for selected_item in self.files_panel.tv.selection():
-            item = self.files_panel.tv.item(selected_item)
-            row = item['values']
-            self.tv_selection.add(tuple(row))
-        rows = list(self.tv_selection)
-        name = rows[0][0].split('.')[0] if '.' in rows[0][0] else rows[0][0]  # TODO: fix when clearing output table
-        path = Path.cwd().parent / 'src' / 'cache' / f'{name}.pickle'
-        self.results = pickle_io.load_pickle(path)
+        selection = self.files_panel.tv.selection()
+        self.tv_selection.update(selection)
+        if not selection:
+            return
+        try:
+            self.results = results_store.load_results(selection[0])
+        except (OSError, ValueError, KeyError):  # evicted from the store, but still listed in the catalogue
+            catalogue.delete(selection)
+            self.files_panel.tv.delete(*selection)
+            app_utils.warn_missing_results()
+            return
         self.fig_panel.change_plot()
 
     def clear_results(self):
         self.files_panel.clear_treeview()
         self.fig_panel.clear_figure()
-        data_utils.clear_pickle()
+        results_store.clear()
+        catalogue.clear()
 
     def load_previous(self):
-        """Check if cached results exist and load cached results from previous analyses"""
-        paths = self.previous.select_cached()
-        if paths:
-            self.files_panel.load_tv_from_pickle(paths)
+        """List previous analyses from the catalogue, filtered by the text of the history panel"""
+        rows = self.previous.select_cached()
+        if rows:
+            self.files_panel.clear_treeview()
+            for row in rows:
+                self.files_panel.insert_row(row)
 
 
 class App(tk.Tk):
@@ -293,60 +464,40 @@ class App(tk.Tk):
         """Reset file processing
         Args:
             path: pathlib path to DICOM file
-        Returns: None
+        Returns: True if the file was loaded
         """
         if path:
             self.path = path
             self.nb.forget(self.view)
+            self.view.img_panel.renderer.close()
             self.set_img_proc()
             self.data.path = self.path
-            data_utils.save_path(str(self.path.resolve()))
+            settings.save_path(str(self.path.resolve()))
             self.nb.insert(0, self.view, text='Image processing')
             self.nb.select(self.view)
             controller = Controller(self.data, self.view, self.output)
             self.view.set_controller(controller)
-            self.display_loading_msg()
             self.update_idletasks()
-            self.check_loading_status()
-            controller.get_dicom_data()
-
-    def display_loading_msg(self):
-        """Display message while file is loading"""
-        self.popup = tk.Toplevel(self)
-        root_x, root_y = self.winfo_rootx(), self.winfo_rooty()
-        offset_w, offset_h = int(self.window_width / 2), int(self.window_height * .3)
-        self.popup.geometry(f'+{root_x + offset_w}+{root_y + offset_h}')
-        msg = tk.Label(self.popup, text="DICOM file loading", padx=10, pady=10)
-        msg.grid(row=0, column=0)
-
-    def check_loading_status(self):
-        """Check whether DICOM file is loaded"""
-        if self.data.ds:
-            self.popup.destroy()
-        else:
-            self.after(10, self.check_loading_status)
+            try:
+                controller.get_dicom_data()  # in a worker thread, with a progress popup
+            except tasks.TaskCancelled:
+                return False
+            return True
+        return False
 
     def paths_handler(self):
         """Handle single/multiple path selection(s)"""
         paths = self.mb.select_files()
         if len(paths) > 0:
-            self.reset(paths[0])
+            if not self.reset(paths[0]):
+                return
             self.wait_variable(self.view.block)
             if len(paths) > 1 and self.view.block.get() is False:
-                cached_path = Path.cwd().parent / 'src' / 'cache' / f'{paths[0].stem}.pickle'
-                cached_file1 = pickle_io.load_pickle(cached_path)
-                roi_coords = cached_file1['roi_coords']
-                roi_shape = cached_file1['roi_shape']
-                self.view.block.set(True)
-                for i, path in enumerate(paths[1:]):
-                    self.reset(path)
-                    self.view.get_usr_entry()
-                    self.view.init_roi_coords = roi_coords  # load detected or user drawn (from 1st file) roi coords
-                    self.view.init_roi_shape = roi_shape
-                    self.view.reset_rois()
-                    self.view.init_roi_coords = self.data.roi_coords  # load detected roi coords for 'reset' button
-                    self.wait_variable(self.view.block)
-                    self.view.process()
+                # other files are analysed unattended with the ROIs and parameters of the 1st file
+                params = self.view.batch_params()
+                batch_queue = tasks.BatchQueue(paths[1:], partial(prepare_batch_file, params=params),
+                                               partial(analyse_batch_file, params=params))
+                self.output.queue_panel.run(batch_queue)
                 self.nb.select(self.output)
 
 # if __name__ == '__main__':
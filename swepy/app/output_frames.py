@@ -1,5 +1,5 @@
+import queue
 import tkinter as tk
-import tkinter.filedialog as fd
 from pathlib import Path
 from tkinter import ttk
 
@@ -9,9 +9,8 @@ import pandastable
 from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg, NavigationToolbar2Tk)
 from matplotlib.figure import Figure
 
-from swepy.processing import data_utils
+from swepy.processing import catalogue, data_utils, results, results_store
 from swepy.processing.data_utils import mean_lowest_stdev_subarray
-from swepy.processing.io.pickle_io import load_pickle
 from swepy.app.app_utils import warn_empty_cache, warn_no_selection
 
 
@@ -24,12 +23,14 @@ class FilesPanel(ttk.LabelFrame):
         self.config(text='Analysed files')
         self.grid(row=0, column=0, padx=5, pady=5, sticky=tk.NW)
 
-        columns = ('file_name', 'path')
-        self.tv = ttk.Treeview(self, columns=columns, show='headings')
-        self.tv.heading('file_name', text='File')
-        self.tv.column('file_name', minwidth=100)
-        self.tv.heading('path', text='Path', anchor=tk.W)
-        self.tv.column('path', minwidth=500)
+        self.columns = ('file_name', 'roi_name', 'path', 'analysed_at', 'mean', 'median', 'mean_low_sd')
+        headings = ('File', 'ROI', 'Path', 'Analysed', 'Mean', 'Median', 'Mean low SD')
+        widths = (150, 80, 300, 130, 60, 60, 80)
+        self.tv = ttk.Treeview(self, columns=self.columns, show='headings')
+        for column, heading, width in zip(self.columns, headings, widths):
+            self.tv.heading(column, text=heading, anchor=tk.W,
+                            command=lambda c=column: self.sort_by(c, descending=False))
+            self.tv.column(column, width=width, minwidth=60)
         self.tv.pack(ipadx=5, ipady=5, fill=tk.BOTH, expand=True)
         self.add_scrollbars()
 
@@ -40,12 +41,26 @@ class FilesPanel(ttk.LabelFrame):
         self.sb_x.pack(side='bottom', fill='x')
         self.sb_y.pack(side='right', fill='y')
 
-    def load_tv_from_pickle(self, paths):
-        """Load cached results from previous analyses"""
-        cached = [load_pickle(path) for path in paths]
-        rows = [results['file'] for results in cached]
-        for row in rows:
-            self.tv.insert('', tk.END, values=row, iid=row[0])
+    def insert_row(self, row):
+        """List an analysed file, using its catalogue entry (see catalogue.query)"""
+        key = row['key']
+        values = [row[column] for column in self.columns]
+        values = [f'{value:.2f}' if isinstance(value, float) else '' if value is None else value for value in values]
+        if key in self.tv.get_children():
+            self.tv.delete(key)
+        self.tv.insert('', tk.END, values=values, iid=key)
+
+    def sort_by(self, column, descending):
+        """Sort listed files by a column, reverse the order at the next click on its heading"""
+        def sort_key(iid):
+            value = self.tv.set(iid, column)
+            try:
+                return 0, float(value)
+            except ValueError:
+                return 1, value.lower()
+        for i, iid in enumerate(sorted(self.tv.get_children(), key=sort_key, reverse=descending)):
+            self.tv.move(iid, '', i)
+        self.tv.heading(column, command=lambda: self.sort_by(column, not descending))
 
     def clear_treeview(self):
         """Clear table with analysed files"""
@@ -63,20 +78,22 @@ class HistoryPanel(ttk.LabelFrame):
         self.config(text='Previous results')
         self.grid(row=1, column=0, padx=5, pady=5, sticky=tk.EW)
 
+        self.filter_var = tk.StringVar()
+        ttk.Label(self, text='Filter:').grid(column=0, row=0, sticky=tk.W, padx=5, pady=5)
+        self.filter_entry = ttk.Entry(self, textvariable=self.filter_var)
+        self.filter_entry.grid(column=1, row=0, columnspan=2, sticky=tk.EW, padx=5, pady=5)
+
         self.load_btn = ttk.Button(self, text='Load')
-        self.load_btn.grid(column=0, row=0, sticky=tk.W, padx=5, pady=5)
+        self.load_btn.grid(column=0, row=1, sticky=tk.W, padx=5, pady=5)
 
         self.clear_all_btn = ttk.Button(self, text='Clear all')
-        self.clear_all_btn.grid(column=2, row=0, sticky=tk.E, padx=5, pady=5)
-
-    @staticmethod
-    def select_cached():
-        """Retrieve cached results files if there are any"""
-        filetypes = (('Cached files', '*.pickle'),)
-        initialdir = Path.cwd().parent / 'src' / 'cache'
-        paths = fd.askopenfilenames(initialdir=initialdir, title="Select file(s)", filetypes=filetypes)
-        if paths:
-            return paths
+        self.clear_all_btn.grid(column=2, row=1, sticky=tk.E, padx=5, pady=5)
+
+    def select_cached(self):
+        """List catalogued previous analyses whose file name or path contains the filter text"""
+        rows = catalogue.query(self.filter_var.get().strip())
+        if rows:
+            return rows
         else:
             warn_empty_cache()
             return
@@ -108,20 +125,19 @@ class SavePanel(ttk.LabelFrame):
         """Export stats for each unique SWE frame
         Args:
             file_format (str): extension of exported file (currently csv and xlsx)
-            selection (list): rows selected in treeview
+            selection (list): ids of rows selected in treeview (keys of stored results)
             everything:
         Returns: None
         """
-        all_rows = [self.output.files_panel.tv.item(child)['values']
-                    for child in self.output.files_panel.tv.get_children()]
-        rows = all_rows if everything else selection
-        if rows:
-            for row in rows:
-                name = row[0].split('.')[0]
-                import_path = Path.cwd().parent / 'src' / 'cache' / f'{name}.pickle'
-                results = load_pickle(import_path)
-                export_path = Path(row[1]) / f'{name}.{file_format}'  # TODO: make results folder if it does not exists
-                dfs = pd.DataFrame.from_dict(results['stats'])
+        all_keys = self.output.files_panel.tv.get_children()
+        keys = all_keys if everything else selection
+        if keys:
+            for key in keys:
+                meta = results_store.load_meta(key)
+                name, parent = meta['file']
+                name = results.export_stem(name, meta.get('roi_name'))
+                export_path = Path(parent) / f'{name}.{file_format}'  # TODO: make results folder if it does not exists
+                dfs = results_store.load_stats(key)
                 if file_format == 'csv':
                     dfs.to_csv(export_path, index_label='frame')
                 if file_format == 'xlsx':
@@ -131,6 +147,69 @@ class SavePanel(ttk.LabelFrame):
             return
 
 
+class QueuePanel(ttk.LabelFrame):
+    """Panel of output tab showing the status of files analysed unattended (see tasks.BatchQueue)"""
+
+    poll_ms = 100
+
+    def __init__(self, parent):
+        super().__init__(parent)
+
+        self.output = parent
+
+        self.config(text='Batch queue')
+        self.grid(row=3, column=0, padx=5, pady=5, sticky=tk.EW)
+
+        self.columns = ('file_name', 'status', 'detail')
+        headings = ('File', 'Status', 'Detail')
+        widths = (150, 80, 300)
+        self.tv = ttk.Treeview(self, columns=self.columns, show='headings', height=5)
+        for column, heading, width in zip(self.columns, headings, widths):
+            self.tv.heading(column, text=heading, anchor=tk.W)
+            self.tv.column(column, width=width, minwidth=60)
+        self.tv.grid(row=0, column=0, padx=5, pady=5, sticky=tk.EW)
+
+        self.cancel_btn = ttk.Button(self, text='Cancel', state=tk.DISABLED, command=self.cancel)
+        self.cancel_btn.grid(row=1, column=0, sticky=tk.E, padx=5, pady=5)
+
+        self.batch_queue = None
+        self.poll_id = None  # set while a queue is running
+
+    def run(self, batch_queue):
+        """List the files of a batch queue, start it and display its progress. A running queue is cancelled"""
+        if self.poll_id is not None:
+            self.batch_queue.cancel()
+            self.after_cancel(self.poll_id)
+        self.tv.delete(*self.tv.get_children())
+        for i, path in enumerate(batch_queue.paths):
+            self.tv.insert('', tk.END, iid=str(i), values=(path.name, 'queued', ''))
+        self.batch_queue = batch_queue
+        self.cancel_btn['state'] = tk.NORMAL
+        batch_queue.start()
+        self.poll_id = self.after(self.poll_ms, self.poll)
+
+    def cancel(self):
+        self.batch_queue.cancel()
+        self.cancel_btn['state'] = tk.DISABLED
+
+    def poll(self):
+        """Display status changes of files, and add results of analysed files"""
+        while True:
+            try:
+                event = self.batch_queue.events.get_nowait()
+            except queue.Empty:
+                break
+            if event is None:  # all files processed
+                self.cancel_btn['state'] = tk.DISABLED
+                self.poll_id = None
+                return
+            i, status, detail = event
+            self.tv.item(str(i), values=(self.batch_queue.paths[i].name, status, detail))
+            if status.startswith('done'):
+                self.output.add_results(*self.batch_queue.results.pop(i))
+        self.poll_id = self.after(self.poll_ms, self.poll)
+
+
 class FigPanel(ttk.Frame):
     """Panel of output tab holding preview figure"""
 
@@ -213,6 +292,7 @@ class FigPanel(ttk.Frame):
             vp['cmedians'].set_color('white')
 
             std = np.nanstd(D, axis=1)
+            frame_means = self.output.results['stats'][f'{swe_var}_mean']
             xy = [[l.vertices[:, 0].mean(), l.vertices[0, 1]] for l in vp['cmeans'].get_paths()]
             xy = np.array(xy)
             axes.scatter(xy[:, 0], xy[:, 1], s=20, c="orange", marker="o", zorder=3)
@@ -228,7 +308,7 @@ class FigPanel(ttk.Frame):
             axes.set_title(f"{self.output.results['file'][0]}, "
                            f"Median: {round(np.nanmedian(D), 2)}, "
                            f"Mean: {round(np.nanmean(D), 2)}, "
-                           f"Mean_low_stdev: {round(mean_lowest_stdev_subarray(D), 2)}, "
+                           f"Mean_low_stdev: {round(mean_lowest_stdev_subarray(frame_means), 2)}, "
                            f"STD: {round(np.nanstd(D), 2)}")
 
         self.figure_canvas.draw_idle()
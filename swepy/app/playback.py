@@ -0,0 +1,39 @@
+import math
+import time
+
+DEFAULT_FHZ = 20  # frame rate if the rate of displayed frames is unknown
+SPEEDS = (0.25, 0.5, 1, 2, 4)  # playback speed multipliers
+
+
+class PlaybackClock:
+    """Wall-clock timing of video playback.
+
+    Displayed frames are derived from the time elapsed since playback started, not from the number of frames
+    already shown, so that playback does not drift when frames take long to render: late frames are dropped.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.first_frame = 0
+        self.fhz = DEFAULT_FHZ
+        self.start_time = None
+
+    def start(self, frame, fhz):
+        """Start (or restart) playback
+        Args:
+            frame (int): index of the first displayed frame
+            fhz (float): frames per second, i.e. frame rate multiplied by the playback speed
+        """
+        self.first_frame = frame
+        self.fhz = fhz or DEFAULT_FHZ
+        self.start_time = self.clock()
+
+    def due_frame(self):
+        """Index of the frame to display now"""
+        return self.first_frame + int((self.clock() - self.start_time) * self.fhz)
+
+    def delay_ms(self):
+        """Time until the next frame is due, in ms (at least 1)"""
+        elapsed = self.clock() - self.start_time
+        next_time = (math.floor(elapsed * self.fhz) + 1) / self.fhz
+        return max(math.ceil((next_time - elapsed) * 1000), 1)
@@ -3,8 +3,8 @@ import tkinter.filedialog as fd
 from pathlib import Path
 from tkinter import ttk
 
-from swepy.processing import data_utils
-from swepy.processing.io import json_io
+from swepy.app import app_utils
+from swepy.processing import frame_cache, settings
 
 
 class MenuBar(tk.Menu):
@@ -21,7 +21,7 @@ class MenuBar(tk.Menu):
         self.file_menu.add_command(label='Open...', command=lambda: self.app.paths_handler())
 
         self.history_submenu = tk.Menu(self.file_menu, tearoff=0)
-        paths_list = data_utils.get_settings('RECENT_PATHS')
+        paths_list = settings.get_settings('RECENT_PATHS')
         for path in paths_list:
             self.history_submenu.add_command(label=path, command=lambda x=Path(path): self.app.reset(x))
         self.file_menu.add_cascade(label='Open recent', menu=self.history_submenu)
@@ -34,6 +34,7 @@ class MenuBar(tk.Menu):
         self.file_menu.add_separator()
         self.file_menu.add_command(label='Clear all results', command=lambda: self.app.output.clear_results())
         self.file_menu.add_command(label='Clear history', command=lambda: self.delete_history())
+        self.file_menu.add_command(label='Clear cached frames', command=lambda: frame_cache.clear())
         self.file_menu.add_command(label='Quit', command=self.app.destroy)
 
         self.edit_menu = tk.Menu(self, tearoff=0)
@@ -43,21 +44,19 @@ class MenuBar(tk.Menu):
         self.help_menu = tk.Menu(self, tearoff=0)
         self.add_cascade(label='Help', underline=0, menu=self.help_menu)
         self.help_menu.add_command(label='Swepy README',
-                                   command=lambda: data_utils.callback('https://tinyurl.com/swepy'))
+                                   command=lambda: app_utils.callback('https://tinyurl.com/swepy'))
 
     def delete_history(self):
         self.history_submenu.delete(0, 'end')
-        data_utils.delete_settings('RECENT_PATHS')
+        settings.delete_settings('RECENT_PATHS')
 
     def select_files(self):
         # filetypes = (('DICOM files', '*.dcm'), ('All files', '*.*'))
         # filetypes unused for now, to make files without extension selectable by default
-        temp_path = Path('..') / 'src' / 'cache' / 'settings.json'
         initialdir = '/'
-        if temp_path.exists():
-            temp = json_io.load_json(temp_path)
-            if temp['RECENT_PATHS']:
-                initialdir = Path(temp['RECENT_PATHS'][0]).parent
+        recent_paths = settings.get_settings('RECENT_PATHS')
+        if recent_paths:
+            initialdir = Path(recent_paths[0]).parent
         # paths = fd.askopenfilenames(initialdir=initialdir, title="Select DICOM file(s)", filetypes=filetypes)
         paths = fd.askopenfilenames(initialdir=initialdir, title="Select DICOM file(s)")
         if paths:
@@ -68,8 +67,8 @@ class MenuBar(tk.Menu):
 
     def open_settings(self):
         """Instantiate Settings class"""
-        settings = Settings(self)
-        settings.grab_set()
+        settings_window = Settings(self)
+        settings_window.grab_set()
 
 
 class Settings(tk.Toplevel):
@@ -87,11 +86,11 @@ class Settings(tk.Toplevel):
         self.sat_frame = ttk.LabelFrame(self, text='Pixel saturation threshold (% of max scale)')
         self.sat_frame.grid(row=0, column=0, sticky=tk.NSEW, padx=5, pady=5)
         self.usr_entry = ttk.Entry(self.sat_frame,
-                                   textvariable=self.menu.app.data.sat_thresh_var,
+                                   textvariable=self.menu.app.view.sat_thresh_var,
                                    validate='key',
                                    validatecommand=(self.sat_frame.register(self.is_number), '%P'))
         self.usr_entry.grid()
-        self.current_value = ttk.Label(self.sat_frame, text=f'threshold: {self.menu.app.data.sat_thresh_var.get()}%')
+        self.current_value = ttk.Label(self.sat_frame, text=f'threshold: {self.menu.app.view.sat_thresh_var.get()}%')
         self.current_value.grid(row=0, column=1)
         self.current_value.bind('<<UpdateNeeded>>', self.update_current_value)
 
@@ -122,15 +121,15 @@ class Settings(tk.Toplevel):
         except ValueError:
             return False
         self.current_value.event_generate('<<UpdateNeeded>>', when='tail')
-        data_utils.save_sat_thresh(value)
+        settings.save_sat_thresh(value)
         return True
 
     def update_current_value(self, event):
         w = event.widget
         # number = int(self.usr_entry.get())
-        number = int(self.menu.app.data.sat_thresh_var.get())
+        number = int(self.menu.app.view.sat_thresh_var.get())
         w['text'] = f'threshold: {number}%'
 
     def log_cmap_loc(self):
-        data_utils.save_cmap_source(self.menu.app.view.cmap_loc_var.get())
+        settings.save_cmap_source(self.menu.app.view.cmap_loc_var.get())
         print(self.menu.app.view.cmap_loc_var.get())
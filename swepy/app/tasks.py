@@ -0,0 +1,196 @@
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk
+
+
+class TaskCancelled(Exception):
+    """Raised when the user cancels a background task"""
+
+
+class BackgroundTask:
+    """Run a long function (e.g. loading or analysing a DICOM file) in a worker thread, while the window stays
+    responsive and a popup shows its progress with a Cancel button.
+
+    The function receives a progress callback (done, total), called from the worker thread for each frame or batch
+    of frames. Progress is passed through a queue and displayed by the Tk thread (after()), the only thread
+    updating widgets. Once Cancel is pressed, the callback raises TaskCancelled, so that the function stops at the
+    next frame. Functions that do not report progress run to completion, but their result is discarded.
+    """
+
+    poll_ms = 50
+
+    def __init__(self, parent, message, func, *args):
+        self.parent = parent
+        self.message = message
+        self.func = func
+        self.args = args
+        self.events = queue.Queue()
+        self.cancelled = threading.Event()
+        self.finished = tk.BooleanVar(parent, False)
+        self.result = None
+        self.error = None
+        self.popup = None
+        self.progress_bar = None
+        self.progress_label = None
+
+    def progress(self, done, total):
+        """Report progress from the worker thread, stop the function if the task was cancelled"""
+        if self.cancelled.is_set():
+            raise TaskCancelled
+        self.events.put((done, total))
+
+    def work(self):
+        try:
+            self.result = self.func(self.progress, *self.args)
+        except BaseException as e:  # raised again in the Tk thread
+            self.error = e
+        self.events.put(None)
+
+    def run(self):
+        """Start the worker thread and wait for it to finish, processing window events meanwhile
+        Returns: return value of the function
+        Raises: TaskCancelled if the task was cancelled, or the exception raised by the function
+        """
+        self.show_popup()
+        threading.Thread(target=self.work, daemon=True).start()
+        self.parent.after(self.poll_ms, self.poll)
+        self.parent.wait_variable(self.finished)  # nested event loop: the window is redrawn while waiting
+        self.popup.grab_release()
+        self.popup.destroy()
+        if self.cancelled.is_set():  # also if the function finished without reporting progress since
+            raise TaskCancelled
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def show_popup(self):
+        root = self.parent.winfo_toplevel()
+        self.popup = tk.Toplevel(root)
+        self.popup.title('swepy')
+        self.popup.transient(root)
+        offset_w, offset_h = int(root.winfo_width() / 2), int(root.winfo_height() * .3)
+        self.popup.geometry(f'+{root.winfo_rootx() + offset_w}+{root.winfo_rooty() + offset_h}')
+        self.popup.protocol('WM_DELETE_WINDOW', self.cancel)
+        msg = tk.Label(self.popup, text=self.message, padx=10, pady=10)
+        msg.grid(row=0, column=0, columnspan=2)
+        self.progress_bar = ttk.Progressbar(self.popup, length=250, mode='indeterminate')
+        self.progress_bar.grid(row=1, column=0, columnspan=2, padx=10)
+        self.progress_bar.start()
+        self.progress_label = ttk.Label(self.popup, text='')
+        self.progress_label.grid(row=2, column=0, sticky=tk.W, padx=10, pady=5)
+        cancel_btn = ttk.Button(self.popup, text='Cancel', command=self.cancel)
+        cancel_btn.grid(row=2, column=1, sticky=tk.E, padx=10, pady=5)
+        self.popup.grab_set()  # other widgets do not respond until the task is finished
+
+    def cancel(self):
+        self.cancelled.set()
+        self.progress_label.config(text='Cancelling...')
+
+    def poll(self):
+        """Display progress events of the worker thread"""
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event is None:
+                self.finished.set(True)
+                return
+            if not self.cancelled.is_set():
+                self.show_progress(*event)
+        self.parent.after(self.poll_ms, self.poll)
+
+    def show_progress(self, done, total):
+        if str(self.progress_bar['mode']) == 'indeterminate':
+            self.progress_bar.stop()
+            self.progress_bar.config(mode='determinate')
+        self.progress_bar.config(maximum=total, value=done)
+        self.progress_label.config(text=f'{done}/{total} frames')
+
+
+def run_task(parent, message, func, *args):
+    """Run a function in a worker thread (see BackgroundTask)
+    Args:
+        parent: widget of the task
+        message (str): description of the task, displayed in the progress popup
+        func: function called with a progress callback (done, total) and args
+    Returns: return value of the function
+    """
+    return BackgroundTask(parent, message, func, *args).run()
+
+
+class BatchQueue:
+    """Process files unattended: each file is prepared (loaded and its frames decoded) in a prefetch thread, while
+    the previous file is analysed in a second thread, so that decoding and analysis overlap.
+
+    Status changes of files (queued, decoding, analysing, done, done (check), failed or cancelled) and their progress
+    are put in a queue of events (index, status, detail), to be displayed by the Tk thread. Files analysed with
+    warnings are 'done (check)', with warnings as detail. Return values of the analyses are kept in self.results.
+    """
+
+    def __init__(self, paths, prepare, analyse):
+        """
+        Args:
+            paths (list): paths to DICOM files
+            prepare: function (path, progress) returning the data of a file, ready for analysis
+            analyse: function (data, progress) analysing prepared data, returning a result and a list of warnings
+        """
+        self.paths = paths
+        self.prepare = prepare
+        self.analyse = analyse
+        self.events = queue.Queue()
+        self.prepared = queue.Queue(maxsize=1)  # files decoded ahead of the analysed file
+        self.cancelled = threading.Event()
+        self.results = {}
+
+    def start(self):
+        for i in range(len(self.paths)):
+            self.events.put((i, 'queued', ''))
+        threading.Thread(target=self.prefetch, daemon=True).start()
+        threading.Thread(target=self.work, daemon=True).start()
+
+    def cancel(self):
+        """Stop processing files, at the next frame of the current files"""
+        self.cancelled.set()
+
+    def progress(self, index, status):
+        """Progress callback of a file, stopping its processing if the queue was cancelled"""
+        def report(done, total):
+            if self.cancelled.is_set():
+                raise TaskCancelled
+            self.events.put((index, status, f'{done}/{total} frames'))
+        return report
+
+    def prefetch(self):
+        for i, path in enumerate(self.paths):
+            data, error = None, None
+            if self.cancelled.is_set():
+                error = TaskCancelled()
+            else:
+                self.events.put((i, 'decoding', ''))
+                try:
+                    data = self.prepare(path, self.progress(i, 'decoding'))
+                except Exception as e:
+                    error = e
+            self.prepared.put((i, data, error))  # waits while the previous file is analysed
+
+    def work(self):
+        for _ in self.paths:
+            i, data, error = self.prepared.get()
+            warnings = []
+            if error is None:
+                self.events.put((i, 'analysing', ''))
+                try:
+                    self.results[i], warnings = self.analyse(data, self.progress(i, 'analysing'))
+                except Exception as e:
+                    error = e
+            if isinstance(error, TaskCancelled):
+                self.events.put((i, 'cancelled', ''))
+            elif error is not None:
+                self.events.put((i, 'failed', f'{type(error).__name__}: {error}'))
+            elif warnings:
+                self.events.put((i, 'done (check)', '; '.join(warnings)))
+            else:
+                self.events.put((i, 'done', ''))
+        self.events.put(None)
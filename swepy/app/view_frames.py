@@ -1,10 +1,11 @@
 import tkinter as tk
 from tkinter import ttk
 
-from PIL import ImageTk, Image
-
 from swepy.app.app_utils import warn_no_video
-from swepy.processing import data_utils
+from swepy.app.frame_renderer import FrameRenderer
+from swepy.app.playback import PlaybackClock, SPEEDS
+from swepy.processing import settings
+from swepy.processing.frames import ProxyFrames
 
 
 class TopPanel(ttk.Frame):
@@ -45,7 +46,7 @@ class LeftPanel(ttk.Frame):
         self.scale_entry = ttk.Entry(self.input_frame, width=4, textvariable=self.usr_scale)
         self.scale_entry.grid(column=1, row=1, sticky=tk.E, padx=5)
 
-        self.usr_params = data_utils.get_settings('SWE_PARAM')
+        self.usr_params = settings.get_settings('SWE_PARAM')
         if self.usr_params:
             self.usr_fhz.set(self.usr_params[0])
             self.usr_scale.set(self.usr_params[1])
@@ -94,7 +95,7 @@ class LeftPanel(ttk.Frame):
 
     def log_swe_var(self):
         """Save last chosen SWE variable"""
-        data_utils.save_swe_var(self.view.swe_var.get())
+        settings.save_swe_var(self.view.swe_var.get())
 
 
 class ImgPanel(ttk.Frame):
@@ -122,7 +123,10 @@ class ImgPanel(ttk.Frame):
         self.roi_coords = []
         self.polyg_top = self.polyg_down = None
 
-        self.current_array = None
+        self.renderer = FrameRenderer(self.canvas)
+        self._current_array = None
+        self.proxy_frames = None  # downsampled copies of displayed frames, in preview mode
+        self.display_factor = 1  # downsampling factor of displayed frames, ROIs are kept at full resolution
         self.img = None
         self.img_name = None
 
@@ -149,11 +153,26 @@ class ImgPanel(ttk.Frame):
             variable=self.shape,
             command=self.reset_draw).grid(column=1, row=0, padx=5, pady=5)
 
+        self.roi_value = ttk.Label(self.roi_frame, text='')  # live readout of ROI values
+        self.roi_value.grid(column=2, row=0, columnspan=3, padx=15, pady=5)
+
+        # named ROIs, all analysed in one pass
+        self.named_rois = {}
+        self.roi_name_var = tk.StringVar()
+        ttk.Label(self.roi_frame, text='Name:').grid(column=0, row=1, sticky=tk.E, padx=5, pady=5)
+        ttk.Entry(self.roi_frame, width=12, textvariable=self.roi_name_var).grid(column=1, row=1, padx=5, pady=5)
+        ttk.Button(self.roi_frame, text='Add ROI', command=self.add_named_roi).grid(column=2, row=1, padx=5, pady=5)
+        ttk.Button(self.roi_frame, text='Clear ROIs',
+                   command=self.clear_named_rois).grid(column=3, row=1, padx=5, pady=5)
+        self.named_rois_label = ttk.Label(self.roi_frame, text='')
+        self.named_rois_label.grid(column=4, row=1, padx=5, pady=5, sticky=tk.W)
+
         self.roi_frame.pack(ipadx=5, ipady=5, anchor=tk.W, expand=True)
 
     # Specific functions
     def activate_draw(self):
         self.canvas.bind('<Button-1>', self.on_button_press)
+        self.canvas.bind('<Motion>', self.on_motion)
         if self.shape.get() == 'polygon':
             self.canvas.bind("<Double-1>", self.on_double_click)
 
@@ -166,9 +185,9 @@ class ImgPanel(ttk.Frame):
     def clear_coords(self):
         self.roi_coords = []
 
-    def isin_top_fov(self):
-        """Check if ROI is drawn in top or bottom field of view"""
-        x_start, y_start = self.roi_coords[0]
+    def isin_top_fov(self, coords=None):
+        """Check if ROI (current one by default) is drawn in top or bottom field of view"""
+        x_start, y_start = (coords or self.roi_coords)[0]
         in_x_bounds = self.top_fov_coords['x0'] <= x_start <= self.top_fov_coords['x1']
         in_y_bounds = self.top_fov_coords['y0'] <= y_start <= self.top_fov_coords['y1']
         return in_x_bounds and in_y_bounds
@@ -181,7 +200,7 @@ class ImgPanel(ttk.Frame):
         Returns: offset list of (x, y) coordinates
         """
         roi_coords = self.roi_coords if not coords else coords
-        roi_offset = 225 if self.isin_top_fov() else -225
+        roi_offset = 225 if self.isin_top_fov(roi_coords if isinstance(roi_coords[0], tuple) else None) else -225
         if isinstance(roi_coords[0], tuple):
             m_coords = [(coord[0], coord[1] + roi_offset) for coord in roi_coords]
         elif isinstance(roi_coords[0], int):
@@ -195,45 +214,127 @@ class ImgPanel(ttk.Frame):
         self.canvas.delete(self.polyg_top, self.polyg_down)
         self.activate_draw()
 
+    @property
+    def current_array(self):
+        """Displayed frames (B-mode or SWE images), at full resolution"""
+        return self._current_array
+
+    @current_array.setter
+    def current_array(self, frames):
+        self._current_array = frames
+        self.show_frames()
+
+    def show_frames(self):
+        """Pass displayed frames to the renderer, as downsampled copies in preview mode"""
+        frames = self._current_array
+        if frames is None or not self.ctrl.preview.get():
+            self.display_factor = 1
+            self.renderer.set_frames(frames)
+            return
+        if self.proxy_frames is None or self.proxy_frames.frames is not frames:
+            self.proxy_frames = ProxyFrames(frames)
+        self.display_factor = self.proxy_frames.factor
+        self.renderer.set_frames(self.proxy_frames)
+
+    def to_canvas(self, coords):
+        """Convert full resolution coordinates, as (x, y) points or flat values, to canvas coordinates"""
+        factor = self.display_factor
+        if factor == 1:
+            return coords
+        if isinstance(coords[0], tuple):
+            return [(x // factor, y // factor) for x, y in coords]
+        return [c // factor for c in coords]
+
+    def from_canvas(self, event):
+        """Full resolution (x, y) coordinates of a canvas event"""
+        return event.x * self.display_factor, event.y * self.display_factor
+
     def get_top_coords(self):
         """Set coordinates of ROI in top field of view as the main ones"""
         self.roi_coords = self.roi_coords if self.isin_top_fov() else self.mirror_coords()
         self.new_roi.set(True)
 
     def set_rois(self):
+        self.draw_named_rois()
         if self.roi_coords:
             self.draw_rois()
 
+    def add_named_roi(self):
+        """Keep the current ROI under a name, to be analysed with other named ROIs"""
+        if not self.roi_coords:
+            return
+        self.get_top_coords()
+        name = self.roi_name_var.get().strip() or f'ROI{len(self.named_rois) + 1}'
+        self.named_rois[name] = list(self.roi_coords)
+        self.roi_name_var.set('')
+        self.set_named_rois(self.named_rois)
+
+    def clear_named_rois(self):
+        self.set_named_rois({})
+
+    def set_named_rois(self, named_rois):
+        self.named_rois = dict(named_rois)
+        self.named_rois_label['text'] = ', '.join(self.named_rois)
+        self.draw_named_rois()
+
+    def draw_named_rois(self):
+        """Draw named ROIs and their mirror in the other field of view, with their name"""
+        self.canvas.delete('named_roi')
+        for name, coords in self.named_rois.items():
+            for roi_coords in (self.to_canvas(coords), self.to_canvas(self.mirror_coords(coords))):
+                if len(roi_coords) > 2:
+                    self.canvas.create_polygon(roi_coords, fill='', outline='yellow', width=1, tags='named_roi')
+                else:
+                    self.canvas.create_rectangle(roi_coords, outline='yellow', width=1, tags='named_roi')
+                x, y = roi_coords[0]
+                self.canvas.create_text(x + 3, y + 3, text=name, anchor=tk.NW, fill='yellow', tags='named_roi')
+
     def draw_rois(self):
         self.canvas.delete(self.polyg_top, self.polyg_down)
         if self.shape.get() == 'rectangle':
             self.draw_rectangle()
         elif self.shape.get() == 'polygon':
             self.draw_polygon()
+        self.show_roi_summary(self.roi_coords)
+
+    def show_roi_summary(self, coords):
+        """Display median and mean of the SWE variable in a ROI, from the SWE map of the file"""
+        controller = self.view.controller
+        summary = None
+        n_points = 2 if self.shape.get() == 'rectangle' else 3
+        if controller and coords and len(coords) >= n_points:
+            top_coords = coords if self.isin_top_fov(coords) else self.mirror_coords(coords)
+            summary = controller.roi_summary(top_coords)
+        if summary is None:
+            self.roi_value['text'] = ''
+            return
+        median, mean = summary
+        label = self.view.left_panel.variable_labels[self.view.swe_var.get()]
+        self.roi_value['text'] = f'{label}  median: {median:.2f}  mean: {mean:.2f}'
 
     def draw_rectangle(self):
-        self.polyg_top = self.canvas.create_rectangle(self.roi_coords,
+        self.polyg_top = self.canvas.create_rectangle(self.to_canvas(self.roi_coords),
                                                       outline='green',
                                                       width=2)
-        self.polyg_down = self.canvas.create_rectangle(*self.mirror_coords(),
+        self.polyg_down = self.canvas.create_rectangle(*self.to_canvas(self.mirror_coords()),
                                                        outline='green',
                                                        width=2)
         self.get_top_coords()
 
     def draw_polygon(self):
         if len(self.roi_coords) == 2:
-            self.polyg_top = self.canvas.create_line(self.roi_coords,
+            self.polyg_top = self.canvas.create_line(self.to_canvas(self.roi_coords),
                                                      fill='green',
                                                      width=2)
-            self.polyg_down = self.canvas.create_line(self.mirror_coords(),
+            self.polyg_down = self.canvas.create_line(self.to_canvas(self.mirror_coords()),
                                                       fill='green',
                                                       width=2)
         elif len(self.roi_coords) > 2:
-            self.polyg_top = self.canvas.create_polygon(self.roi_coords,
+            self.polyg_top = self.canvas.create_polygon(self.to_canvas(self.roi_coords),
                                                         fill='',
                                                         outline='green',
                                                         width=2)
-            self.polyg_down = self.canvas.create_polygon(self.mirror_coords(),
+            self.polyg_down = self.canvas.create_polygon(self.to_canvas(self.mirror_coords()),
                                                          fill='',
                                                          outline='green',
                                                          width=2)
@@ -241,20 +342,30 @@ class ImgPanel(ttk.Frame):
     def on_double_click(self, event):
         self.get_top_coords()
 
+    def on_motion(self, event):
+        """Update ROI readout while the ROI is drawn, as if the next point was at the cursor"""
+        if self.new_roi.get() or not self.roi_coords:
+            return
+        if self.shape.get() == 'rectangle':
+            coords = [self.roi_coords[0], self.from_canvas(event)]
+        else:
+            coords = self.roi_coords + [self.from_canvas(event)]
+        self.show_roi_summary(coords)
+
     def on_button_press(self, event):
         if self.new_roi.get():
             self.reset_draw()
         self.new_roi.set(False)
-        x, y = event.x, event.y
+        x, y = self.from_canvas(event)
         self.roi_coords.append((x, y))
         self.canvas.delete(self.polyg_top, self.polyg_down)
         if len(self.roi_coords) == 1:
             pt_coords = (x - 1, y - 1, x + 1, y + 1)
-            self.polyg_top = self.canvas.create_oval(pt_coords,
+            self.polyg_top = self.canvas.create_oval(self.to_canvas(pt_coords),
                                                      fill='green',
                                                      outline='green',
                                                      width=5)
-            self.polyg_down = self.canvas.create_oval(self.mirror_coords(pt_coords),
+            self.polyg_down = self.canvas.create_oval(self.to_canvas(self.mirror_coords(pt_coords)),
                                                       fill='green',
                                                       outline='green',
                                                       width=5)
@@ -288,12 +399,40 @@ class DisplayControls(ttk.Frame):
         self.frame_label = ttk.Label(self, width=10, text='')
         self.frame_label.pack(side='left')
 
+        self.fhz = None  # frame rate of displayed frames (B-mode or SWE)
+        self.clock = PlaybackClock()
+        self.speed = tk.StringVar(value='1x')
+        self.speed_box = ttk.Combobox(self, width=5, state='readonly', textvariable=self.speed,
+                                      values=[f'{speed:g}x' for speed in SPEEDS])
+        self.speed_box.pack(side='left', padx=5)
+        self.speed_box.bind('<<ComboboxSelected>>', self.restart_clock)
+
+        self.preview = tk.BooleanVar(value=False)  # browse downsampled frames, analyses still use full resolution
+        self.preview_btn = ttk.Checkbutton(self, text='Preview', variable=self.preview, command=self.toggle_preview)
+        self.preview_btn.pack(side='left', padx=5)
+
+    def set_frame_rate(self, fhz):
+        """Set the frame rate (Hz) at which displayed frames were acquired, i.e. of real-time playback"""
+        self.fhz = fhz
+        self.restart_clock()
+
+    def restart_clock(self, event=None):
+        """Time playback from the current frame, e.g. after a change of speed or frame"""
+        self.clock.start(self.current_frame, self.fhz and self.fhz * float(self.speed.get().rstrip('x')))
+        self.img_panel.canvas.focus_set()
+
+    def toggle_preview(self):
+        self.img_panel.show_frames()
+        if self.img_panel.current_array is not None:
+            self.update_frame()
+        self.img_panel.canvas.focus_set()
+
     def update_slider(self, event):
         if int(self.current_value.get()) < self.img_panel.n_frames:
             self.current_frame = int(self.current_value.get())
             self.frame_label.config(text=f'{self.current_frame + 1}/{self.img_panel.n_frames}')
             self.update_frame()
-            self.img_panel.canvas.focus_set()
+            self.restart_clock()
 
     def toggle_play_pause(self):
         if self.pause:
@@ -304,14 +443,19 @@ class DisplayControls(ttk.Frame):
         else:
             self.pause = True
             self.play_btn.config(text='Pause')
+            self.restart_clock()
             self.play_video()
 
     def play_video(self):
+        """Display the frame due at the current time and schedule the next one. Frames whose time has passed while
+        rendering are skipped, so that the video plays in real time (times the speed)"""
         if self.img_panel.current_array is not None:
-            self.update_frame()
-            self.current_frame += 1
-            if self.current_frame < self.img_panel.n_frames:
-                self.after_id = self.after(50, self.play_video)  # 50ms
+            frame = self.clock.due_frame()
+            if frame < self.img_panel.n_frames:
+                if frame != self.current_frame:
+                    self.current_frame = frame
+                    self.update_frame()
+                self.after_id = self.after(self.clock.delay_ms(), self.play_video)
             else:
                 self.pause = False
                 self.play_btn.config(text='Play')
@@ -323,17 +467,17 @@ class DisplayControls(ttk.Frame):
     def update_frame(self):
         self.current_value.set(self.current_frame)
         self.frame_label.config(text=f'{self.current_frame + 1}/{self.img_panel.n_frames}')
-        self.image = Image.fromarray(self.img_panel.current_array[self.current_frame])
-        self.img = ImageTk.PhotoImage(image=self.image)
-        self.img_panel.canvas.create_image(0, 0, anchor=tk.NW, image=self.img)
+        self.img_panel.renderer.show(self.current_frame)
         self.img_panel.set_rois()
 
     def left_key(self, event):
         if int(self.current_value.get()) > 0:
             self.current_frame -= 1
             self.update_frame()
+            self.restart_clock()
 
     def right_key(self, event):
         if int(self.current_value.get()) < self.img_panel.n_frames - 1:
             self.current_frame += 1
             self.update_frame()
+            self.restart_clock()
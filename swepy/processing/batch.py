@@ -0,0 +1,189 @@
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from swepy.processing import results
+from swepy.processing.data import DcmData
+
+SWE_VARS = ('velocity', 'shear_m', 'youngs_m')
+CMAP_LOCS = ('local_cmap', 'external_cmap')
+
+
+def expand_paths(patterns):
+    """List files matching paths or glob patterns, in the order given and without duplicates"""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for match in matches:
+            path = Path(match)
+            if path.is_file() and path not in paths:
+                paths.append(path)
+    return paths
+
+
+def parse_roi(values):
+    """Convert ROI coordinates from the command line to the format used by DcmData.get_rois
+    Args:
+        values (list): 'x,y' strings. 2 points for a rectangle (corners), more for a polygon.
+            The first string may start with the name of the ROI, e.g. 'proximal:120,80'
+    Returns: name of the ROI (None if unnamed) and list of (x, y) tuples
+    """
+    name = None
+    if ':' in values[0]:
+        name, first = values[0].split(':', 1)
+        values = [first] + list(values[1:])
+    coords = []
+    for value in values:
+        x, y = value.split(',')
+        coords.append((int(x), int(y)))
+    if len(coords) < 2:
+        raise argparse.ArgumentTypeError('ROI needs at least 2 points')
+    return name, coords
+
+
+def name_rois(rois):
+    """Name ROIs parsed from the command line: a single unnamed ROI stays unnamed, others are numbered
+    Args:
+        rois (list): (name, coordinates) tuples
+    Returns: dictionary of ROI name: coordinates
+    """
+    if len(rois) == 1:
+        return dict(rois)
+    named = {}
+    for i, (name, coords) in enumerate(rois, start=1):
+        name = name or f'ROI{i}'
+        if name in named:
+            raise argparse.ArgumentTypeError(f'ROI name used twice: {name}')
+        named[name] = coords
+    return named
+
+
+def write_stats(results, export_path):
+    """Save stats of each SWE frame to a csv or xlsx file"""
+    dfs = pd.DataFrame.from_dict(results['stats'])
+    if export_path.suffix == '.xlsx':
+        dfs.to_excel(export_path, index_label='frame')
+    else:
+        dfs.to_csv(export_path, index_label='frame')
+
+
+def analyse_file(path, params):
+    """Load, resample and analyse a DICOM file, then save its results. Runs in worker processes.
+    Args:
+        path (pathlib.Path): path to DICOM file
+        params (dict): analysis parameters, see parse_args
+    Returns: list of (path of the exported stats table, summary values of the analysed SWE variable), one per ROI,
+        and list of warnings
+    """
+    data = DcmData(path)
+    data.read_header()
+    data.swe_fhz = params['swe_fhz']
+    data.max_scale = params['max_scale']
+    if data.max_scale is None:
+        data.locate_colour_bar(read_label=True)
+        if not data.detected_max_scale:
+            raise ValueError('max. scale could not be read from the colour bar, use --max-scale')
+        data.max_scale = data.detected_max_scale
+    data.analysis_swe_var = params['swe_var']
+    data.workers = params['threads']
+    data.max_bytes = params['max_bytes']
+    rois = params['rois'] or {None: data.roi_coords}  # default ROI: SWE box
+    out_dir = Path(params['out_dir']) if params['out_dir'] else path.resolve().parent
+    out_dir.mkdir(parents=True, exist_ok=True)
+    outputs = []
+    # files are only decoded if a ROI was not analysed before with the same parameters
+    for name, _ in data.analyse_rois(rois, params['cmap_loc'], sat_thresh=params['sat_thresh']):
+        export_path = out_dir / f'{results.export_stem(path.stem, name)}.{params["format"]}'
+        write_stats(data.results, export_path)
+        outputs.append((export_path, {'mean': data.mean, 'median': data.median,
+                                      'mean_low_stdev': data.mean_low_stdev}))
+    warnings = data.check_estimates()
+    return outputs, warnings
+
+
+def run_batch(paths, params, workers=None):
+    """Analyse DICOM files in parallel processes
+    Args:
+        paths (list): paths to DICOM files
+        params (dict): analysis parameters, see parse_args
+        workers (int): number of worker processes. Number of CPUs if None
+    Returns: list of paths to files that could not be analysed
+    """
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(analyse_file, path, params): path for path in paths}
+        for i, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                outputs, warnings = future.result()
+            except Exception as e:
+                failed.append(path)
+                print(f'[{i}/{len(paths)}] {path}: FAILED ({type(e).__name__}: {e})', file=sys.stderr)
+            else:
+                for export_path, summary in outputs:
+                    values = ', '.join(f'{k}: {v:.2f}' for k, v in summary.items())
+                    print(f'[{i}/{len(paths)}] {path} -> {export_path} ({values})')
+                for warning in warnings:
+                    print(f'[{i}/{len(paths)}] {path}: WARNING {warning}', file=sys.stderr)
+    return failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m swepy',
+                                     description='Analyse shear wave elastography DICOM files without the GUI')
+    parser.add_argument('files', nargs='+', help='DICOM files or glob patterns (quoted, e.g. "scans/**/*.dcm")')
+    parser.add_argument('--swe-fhz', type=float, default=None,
+                        help='acquisition frequency of SWE frames, only used if changes of SWE data are not found '
+                             'in frames (default: estimated from frames)')
+    parser.add_argument('--max-scale', type=float, default=None,
+                        help='maximal value of the colour scale (default: read from the label of the colour bar)')
+    parser.add_argument('--swe-var', choices=SWE_VARS, default='youngs_m',
+                        help='variable displayed by the colour scale (default: youngs_m)')
+    parser.add_argument('--cmap-loc', choices=CMAP_LOCS, default='local_cmap',
+                        help='source of colour map: image colour bar or standard reference (default: local_cmap)')
+    parser.add_argument('--roi', nargs='+', action='append', metavar='X,Y',
+                        help='ROI corners (2 points) or polygon vertices, in image pixels, optionally preceded by '
+                             'a name (e.g. proximal:120,80 200,140). Repeat for several ROIs. Default: SWE box')
+    parser.add_argument('--sat-thresh', type=int, default=98,
+                        help='%% of max scale above which pixels are considered saturated (default: 98)')
+    parser.add_argument('--format', choices=('csv', 'xlsx'), default='csv', help='format of stats tables')
+    parser.add_argument('--out-dir', help='directory of stats tables (default: directory of each file)')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: CPUs)')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='number of threads mapping colours in each worker process (default: CPUs / workers)')
+    parser.add_argument('--max-memory', type=int, default=None, metavar='MB',
+                        help='memory budget of each worker process in MB, frames are analysed in batches within '
+                             'this budget (default: 1024)')
+    args = parser.parse_args(argv)
+    try:
+        args.rois = name_rois([parse_roi(values) for values in args.roi]) if args.roi else None
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        parser.error(f'--roi: {e}')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = expand_paths(args.files)
+    if not paths:
+        print('No files found', file=sys.stderr)
+        return 1
+    workers = args.workers or min(os.cpu_count() or 1, len(paths))
+    params = {'swe_fhz': args.swe_fhz,
+              'max_scale': args.max_scale,
+              'swe_var': args.swe_var,
+              'cmap_loc': args.cmap_loc,
+              'rois': args.rois,
+              'sat_thresh': args.sat_thresh,
+              'format': args.format,
+              'out_dir': args.out_dir,
+              'threads': args.threads or max((os.cpu_count() or 1) // workers, 1),
+              'max_bytes': args.max_memory * 2 ** 20 if args.max_memory else None}
+    failed = run_batch(paths, params, workers)
+    print(f'{len(paths) - len(failed)}/{len(paths)} files analysed')
+    return 1 if failed else 0
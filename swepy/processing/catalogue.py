@@ -0,0 +1,144 @@
+import json
+import sqlite3
+from datetime import datetime
+
+from swepy.processing import data_utils
+
+COLUMNS = ('key', 'file_name', 'path', 'roi_name', 'sop_uid', 'swe_var', 'swe_fhz', 'detected_swe_fhz',
+           'swe_fhz_confidence', 'max_scale', 'cmap_loc', 'sat_thresh', 'roi_shape', 'roi_coords', 'n_frames',
+           'analysed_at', 'mean', 'median', 'mean_low_sd')
+ORDER_COLUMNS = ('file_name', 'path', 'roi_name', 'analysed_at', 'mean', 'median', 'mean_low_sd')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    key TEXT PRIMARY KEY,
+    file_name TEXT,
+    path TEXT,
+    roi_name TEXT,
+    sop_uid TEXT,
+    swe_var TEXT,
+    swe_fhz REAL,
+    detected_swe_fhz REAL,
+    swe_fhz_confidence REAL,
+    max_scale REAL,
+    cmap_loc TEXT,
+    sat_thresh INTEGER,
+    roi_shape TEXT,
+    roi_coords TEXT,
+    n_frames INTEGER,
+    analysed_at TEXT,
+    mean REAL,
+    median REAL,
+    mean_low_sd REAL
+);
+CREATE INDEX IF NOT EXISTS idx_file_name ON analyses (file_name);
+CREATE INDEX IF NOT EXISTS idx_analysed_at ON analyses (analysed_at);
+"""
+
+
+def db_path():
+    """Path of the SQLite catalogue of analyses"""
+    return data_utils.cache_dir() / 'catalogue.sqlite'
+
+
+_CREATED = set()  # paths of catalogues created or updated by this process
+
+
+def connect(path=None):
+    """Open the catalogue, creating it (once per process) if needed"""
+    path = path or db_path()
+    if path not in _CREATED:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)  # waits for writes of other processes (e.g. batch workers)
+    conn.row_factory = sqlite3.Row
+    if path not in _CREATED:
+        conn.executescript(SCHEMA)
+        existing = {row['name'] for row in conn.execute('PRAGMA table_info(analyses)')}
+        for column in COLUMNS:
+            if column not in existing:  # catalogue created by a previous version
+                conn.execute(f'ALTER TABLE analyses ADD COLUMN {column}')
+        _CREATED.add(path)
+    return conn
+
+
+def add_analysis(data, key, path=None):
+    """Add or replace the catalogue entry of an analysed file
+    Args:
+        data (DcmData): analysed data
+        key (str): key of the stored results
+        path: path of the catalogue. Default: db_path()
+    Returns: None
+    """
+    row = {'key': key,
+           'file_name': data.path.name,
+           'path': str(data.path.resolve().parent),
+           'roi_name': data.roi_name,
+           'sop_uid': str(data.ds.get('SOPInstanceUID', '')),
+           'swe_var': data.analysis_swe_var,
+           'swe_fhz': data.swe_fhz,
+           'detected_swe_fhz': data.detected_swe_fhz,
+           'swe_fhz_confidence': data.swe_fhz_confidence,
+           'max_scale': data.max_scale,
+           'cmap_loc': data.cmap_loc,
+           'sat_thresh': data.sat_thresh,
+           'roi_shape': data.roi_shape,
+           'roi_coords': json.dumps([list(coord) for coord in data.roi_coords]),
+           'n_frames': len(data.indices),
+           'analysed_at': datetime.now().isoformat(timespec='seconds'),
+           'mean': float(data.mean),
+           'median': float(data.median),
+           'mean_low_sd': float(data.mean_low_stdev)}
+    conn = connect(path)
+    with conn:
+        conn.execute(f'INSERT OR REPLACE INTO analyses ({", ".join(COLUMNS)}) '
+                     f'VALUES ({", ".join("?" * len(COLUMNS))})',
+                     [row[column] for column in COLUMNS])
+    conn.close()
+
+
+def query(text='', order_by='analysed_at', descending=True, limit=None, path=None):
+    """List catalogued analyses
+    Args:
+        text (str): only list files whose name, directory or ROI name contains this text
+        order_by (str): column to sort by, one of ORDER_COLUMNS
+        descending (bool): sort order
+        limit (int): maximum number of rows
+        path: path of the catalogue. Default: db_path()
+    Returns: list of rows (dictionaries)
+    """
+    if order_by not in ORDER_COLUMNS:
+        raise ValueError(f'order_by: {order_by}. Must be one of {ORDER_COLUMNS}')
+    sql = f'SELECT * FROM analyses WHERE file_name LIKE ? OR path LIKE ? OR roi_name LIKE ? ' \
+          f'ORDER BY {order_by} {"DESC" if descending else "ASC"}'
+    params = [f'%{text}%'] * 3
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    conn = connect(path)
+    rows = [dict(row) for row in conn.execute(sql, params)]
+    conn.close()
+    return rows
+
+
+def get(key, path=None):
+    """Return the catalogue entry of stored results, or None"""
+    conn = connect(path)
+    row = conn.execute('SELECT * FROM analyses WHERE key = ?', (key,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def delete(keys, path=None):
+    """Delete catalogue entries of stored results (e.g. evicted from the results store)"""
+    conn = connect(path)
+    with conn:
+        conn.executemany('DELETE FROM analyses WHERE key = ?', [(key,) for key in keys])
+    conn.close()
+
+
+def clear(path=None):
+    """Delete all catalogue entries"""
+    conn = connect(path)
+    with conn:
+        conn.execute('DELETE FROM analyses')
+    conn.close()
@@ -0,0 +1,223 @@
+import hashlib
+import json
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from scipy import ndimage
+from skimage.transform import resize
+
+from swepy.processing import settings, swe_frames
+
+DEFAULT_COLOUR_BAR = (693, 70, 701, 180)  # x0, y0, x1, y1 (exclusive) of the Aixplorer colour bar, retrieved from IJ
+MIN_BAR_HEIGHT = 32  # pixels
+MIN_DIGIT_SCORE = 0.5  # correlation with digit templates below which a glyph is not read as a digit
+LOW_LABEL_SCORE = 0.8  # score of a read label below which its value should be checked
+TEMPLATE_SIZE = 64  # font size of rendered digit templates
+GLYPH_SIZE = 24  # size of glyphs compared to digit templates
+SANS_SERIF_FONTS = ('DejaVuSans.ttf', 'arial.ttf', 'Arial.ttf', 'Helvetica.ttc')  # first one found is used
+
+
+def geometry_key(ds):
+    """Key of the device model and geometry of ultrasound regions of a DICOM dataset, under which the location of
+    the colour bar is cached"""
+    regions = [[int(region.get(name, 0)) for name in ('RegionLocationMinX0', 'RegionLocationMinY0',
+                                                      'RegionLocationMaxX1', 'RegionLocationMaxY1')]
+               for region in ds.get('SequenceOfUltrasoundRegions', [])]
+    geometry = {'manufacturer': str(ds.get('Manufacturer', '')),
+                'model': str(ds.get('ManufacturerModelName', '')),
+                'size': [int(ds.get('Rows', 0)), int(ds.get('Columns', 0))],
+                'regions': regions}
+    return hashlib.sha1(json.dumps(geometry, sort_keys=True).encode()).hexdigest()
+
+
+def cached_location(ds):
+    """Location of the colour bar and scale label found before in files of the same device and geometry
+    Returns: dictionary with 'bar' (x0, y0, x1, y1) and 'label' (y0, y1 of the text line, None if not found),
+        None if not cached
+    """
+    return settings.shared().get('COLOUR_BARS', {}).get(geometry_key(ds))
+
+
+def cache_location(ds, location):
+    colour_bars = settings.shared().get('COLOUR_BARS', {})
+    colour_bars[geometry_key(ds)] = location
+    settings.shared().set('COLOUR_BARS', colour_bars)
+    settings.shared().flush()  # written at once, as batch worker processes exit without running atexit functions
+
+
+def find_colour_bar(frame, exclude=None, void_threshold=150):
+    """Locate the colour bar: the tallest narrow region of coloured pixels whose rows are of uniform colour
+    Args:
+        frame: (rows, columns, 3) RGB image
+        exclude (tuple): x0, y0, x1, y1 image coordinates (inclusive) of a region to ignore, e.g. the SWE box
+        void_threshold (int): cumulative difference between channels above which pixels are coloured
+    Returns: x0, y0, x1, y1 (exclusive) of the colour bar, without its borders. None if not found
+    """
+    rgb = np.asarray(frame).astype(np.int16)
+    coloured = swe_frames.colour_mask(rgb, void_threshold)
+    if exclude is not None:
+        x0, y0, x1, y1 = exclude
+        coloured[y0:y1 + 1, x0:x1 + 1] = False
+    labels, _ = ndimage.label(coloured)
+    best = None
+    for i, (rows, cols) in enumerate(ndimage.find_objects(labels), start=1):
+        height, width = rows.stop - rows.start, cols.stop - cols.start
+        if height < MIN_BAR_HEIGHT or height < 4 * width:
+            continue
+        component = labels[rows, cols] == i
+        # trim borders and anti-aliased edges: keep columns and rows (nearly) filled with colours
+        full_cols = np.flatnonzero(component.mean(axis=0) >= 0.9)
+        if not len(full_cols):
+            continue
+        col_start, col_stop = cols.start + full_cols[0], cols.start + full_cols[-1] + 1
+        full_rows = np.flatnonzero(component[:, full_cols[0]:full_cols[-1] + 1].all(axis=1))
+        if not len(full_rows):
+            continue
+        row_start, row_stop = rows.start + full_rows[0], rows.start + full_rows[-1] + 1
+        bar = rgb[row_start:row_stop, col_start:col_stop]
+        n_colours = len(np.unique(bar.mean(axis=1).astype(int), axis=0))
+        # a colour scale changes from row to row but not along rows
+        if bar.std(axis=1).mean() > 10 or n_colours < (row_stop - row_start) / 4:
+            continue
+        if best is None or row_stop - row_start > best[3] - best[1]:
+            best = (int(col_start), int(row_start), int(col_stop), int(row_stop))
+    return best
+
+
+def text_pixels(frame, bar, label_rows=None):
+    """Brightness of grey pixels and mask of bright grey (text) pixels around the top of the colour bar
+    Args:
+        frame: (rows, columns, 3) RGB image
+        bar (tuple): x0, y0, x1, y1 (exclusive) of the colour bar
+        label_rows (tuple): y0, y1 of the searched text line. Around the top of the bar if None
+    Returns: brightness (0 to 1), mask and image coordinates (x, y) of their upper left pixel
+    """
+    x0, y0, x1, y1 = bar
+    height = y1 - y0
+    if label_rows is None:
+        label_rows = (y0 - height // 4, y0 + height // 4)
+    top, bottom = max(label_rows[0], 0), min(label_rows[1], frame.shape[0])
+    left, right = max(x0 - height // 2, 0), min(x1 + height // 2, frame.shape[1])
+    rgb = np.asarray(frame[top:bottom, left:right]).astype(np.int16)
+    grey = np.where(swe_frames.colour_mask(rgb, 60), 0, rgb.min(axis=-1)) / 255
+    grey[:, max(x0 - left, 0):x1 - left] = 0
+    return grey, grey > 0.5, (left, top)
+
+
+def normalise_glyph(glyph):
+    """Scale a glyph to GLYPH_SIZE, keeping its aspect ratio, centre it on a square and blur it slightly, so that
+    glyphs of different sizes and fonts can be compared"""
+    height, width = glyph.shape
+    scale = GLYPH_SIZE / max(height, width)
+    shape = (max(round(height * scale), 1), max(round(width * scale), 1))
+    square = np.zeros((GLYPH_SIZE, GLYPH_SIZE))
+    top, left = (GLYPH_SIZE - shape[0]) // 2, (GLYPH_SIZE - shape[1]) // 2
+    square[top:top + shape[0], left:left + shape[1]] = resize(glyph.astype(float), shape, anti_aliasing=True)
+    square = ndimage.gaussian_filter(square, 1)
+    square -= square.mean()
+    norm = np.sqrt((square ** 2).sum())
+    return square / norm if norm else square
+
+
+@lru_cache(maxsize=None)
+def digit_templates():
+    """Normalised images of digits rendered with the default font and, if installed, a sans-serif system font"""
+    fonts = [ImageFont.load_default(TEMPLATE_SIZE)]
+    for name in SANS_SERIF_FONTS:
+        try:
+            fonts.append(ImageFont.truetype(name, TEMPLATE_SIZE))  # searched in system font folders
+            break
+        except OSError:
+            continue
+    templates = []
+    for font in fonts:
+        for digit in '0123456789':
+            img = Image.new('L', (TEMPLATE_SIZE * 2, TEMPLATE_SIZE * 2), 0)
+            ImageDraw.Draw(img).text((TEMPLATE_SIZE // 2, TEMPLATE_SIZE // 2), digit, fill=255, font=font)
+            arr = np.asarray(img, dtype=float) / 255
+            rows, cols = np.flatnonzero(arr.any(axis=1)), np.flatnonzero(arr.any(axis=0))
+            templates.append((digit, normalise_glyph(arr[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1])))
+    return templates
+
+
+def match_digit(glyph):
+    """Find the digit template most correlated to a glyph
+    Args:
+        glyph: 2D grey image cropped to the ink of one character
+    Returns: digit and score (correlation, 1 for identical images)
+    """
+    glyph = normalise_glyph(glyph)
+    scores = [(digit, float((glyph * template).sum())) for digit, template in digit_templates()]
+    return max(scores, key=lambda score: score[1])
+
+
+def read_label(frame, bar, label_rows=None):
+    """Read the maximum of the colour scale, written next to the top of the colour bar
+    Args:
+        frame: (rows, columns, 3) RGB image
+        bar (tuple): x0, y0, x1, y1 (exclusive) of the colour bar
+        label_rows (tuple): y0, y1 of the text line (e.g. cached from a previous file). Searched if None
+    Returns: value (None if not read), score (lowest score of its digits) and y0, y1 of the text line
+    """
+    grey, mask, (left, top) = text_pixels(frame, bar, label_rows)
+    labels, _ = ndimage.label(mask, structure=np.ones((3, 3)))
+    ink = ndimage.binary_dilation(mask, np.ones((3, 3)))  # includes anti-aliased edges of glyphs
+    objects = ndimage.find_objects(labels)
+    glyphs = [(rows, cols) for rows, cols in objects if 5 <= rows.stop - rows.start <= (bar[3] - bar[1]) // 4]
+    if not glyphs:
+        return None, 0.0, None
+    # text line closest to the top of the bar, including decimal points
+    def distance_to_top(glyph):
+        return abs((glyph[0].start + glyph[0].stop) / 2 + top - bar[1])
+
+    first = min(glyphs, key=distance_to_top)
+    line = [glyph for glyph in glyphs if glyph[0].start < first[0].stop and first[0].start < glyph[0].stop]
+    line_top, line_bottom = min(g[0].start for g in line), max(g[0].stop for g in line)
+    points = [(rows, cols) for rows, cols in objects if rows.stop - rows.start < 5
+              and line_bottom - (line_bottom - line_top) // 4 <= rows.stop <= line_bottom + 1]
+    line = sorted(line + points, key=lambda glyph: glyph[1].start)
+    # word closest to the bar
+    words, word = [], [line[0]]
+    for glyph in line[1:]:
+        if glyph[1].start - word[-1][1].stop > 0.6 * (line_bottom - line_top):
+            words.append(word)
+            word = []
+        word.append(glyph)
+    words.append(word)
+    bar_x = (bar[0] + bar[2]) / 2 - left
+    word = min(words, key=lambda w: min(abs(w[0][1].start - bar_x), abs(w[-1][1].stop - bar_x)))
+    text, scores = '', []
+    for rows, cols in word:
+        if rows.stop - rows.start < 0.3 * (line_bottom - line_top):  # decimal point
+            text += '.'
+            continue
+        digit, score = match_digit(np.where(ink[rows, cols] > 0, grey[rows, cols], 0))
+        if score < MIN_DIGIT_SCORE:
+            break  # e.g. unit following the value
+        text += digit
+        scores.append(score)
+    try:
+        value = float(text.strip('.'))
+    except ValueError:
+        return None, 0.0, None
+    return value, min(scores), (line_top + top, line_bottom + top)
+
+
+def locate(ds, frame, exclude=None):
+    """Locate the colour bar and scale label, from the cache of the device geometry or by searching the frame
+    Args:
+        ds: DICOM dataset
+        frame: (rows, columns, 3) RGB image
+        exclude (tuple): x0, y0, x1, y1 image coordinates (inclusive) of a region to ignore, e.g. the SWE box
+    Returns: dictionary with 'bar' (x0, y0, x1, y1) and 'label' (y0, y1 of the text line, None if not found)
+    """
+    location = cached_location(ds)
+    if location is None:
+        bar = find_colour_bar(frame, exclude)
+        if bar is None:
+            return {'bar': list(DEFAULT_COLOUR_BAR), 'label': None}  # not cached, searched again in later files
+        _, _, label_rows = read_label(frame, bar)
+        location = {'bar': list(bar), 'label': list(label_rows) if label_rows else None}
+        cache_location(ds, location)
+    return location
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from swepy.processing import data_utils, settings
+
+
+class RgbLut:
+    """Dense lookup table mapping every 24-bit RGB colour to the index of the closest colour profile entry.
+
+    Entries are computed on first encounter of a colour (or all at once with `build`), so that each colour is
+    only searched once per colour profile. Results are identical to `data_utils.closest_rgb`.
+    """
+
+    def __init__(self, colour_profile, table=None):
+        self.colour_profile = np.asarray(colour_profile).astype(np.int64)
+        assert len(self.colour_profile.shape) == 2, 'Color scale array must be two-dimensional (H, 3)'
+        self.dtype = np.uint8 if self.colour_profile.shape[0] < 255 else np.uint16
+        self.missing = np.iinfo(self.dtype).max  # marks colours not searched yet
+        if table is None:
+            table = np.full(2 ** 24, self.missing, dtype=self.dtype)
+        self.table = table
+        self.key = profile_hash(self.colour_profile)
+        self.modified = False
+        self._lock = threading.Lock()  # entries are filled by one thread at a time (see parallel.map_chunks)
+
+    def search(self, codes):
+        """Find closest colour profile indices for packed RGB codes
+        Args:
+            codes: 1D array of RGB values packed as 24-bit integers
+        Returns: array of colour profile indices
+        """
+        rgb = np.stack((codes >> 16, (codes >> 8) & 255, codes & 255), axis=-1).astype(np.float64)
+        profile = self.colour_profile.astype(np.float64)
+        # |c - p|^2 = |c|^2 - 2 c.p + |p|^2, where |c|^2 does not change the argmin (exact for 8-bit integers)
+        distances = (profile ** 2).sum(axis=1) - 2 * rgb @ profile.T
+        return distances.argmin(-1).astype(self.dtype)
+
+    def fill(self, codes):
+        """Search and store entries of the table that have not been computed yet"""
+        unknown = codes[self.table[codes] == self.missing]
+        if unknown.size:
+            with self._lock:
+                unknown = np.unique(unknown)
+                unknown = unknown[self.table[unknown] == self.missing]  # not filled meanwhile by other threads
+                if unknown.size:
+                    self.table[unknown] = self.search(unknown)
+                    self.modified = True
+
+    def build(self, chunk_size=2 ** 16):
+        """Compute all entries of the table"""
+        for start in range(0, self.table.size, chunk_size):
+            chunk = self.table[start:start + chunk_size]
+            if np.any(chunk == self.missing):
+                chunk[:] = self.search(np.arange(start, start + chunk.size, dtype=np.uint32))
+                self.modified = True
+        return self
+
+    def closest_rgb(self, roi_rgb):
+        """
+        Get indices of closest RGB values from scale to input RGB values, with a single table lookup
+        Args:
+            roi_rgb: region of interest array, with RGB channels in the last dimension
+        Returns: array of scale_height indices, of shape roi_rgb.shape[:-1]
+        """
+        codes = pack_rgb(roi_rgb)
+        self.fill(codes.ravel())
+        return self.table[codes]
+
+
+def pack_rgb(rgb):
+    """Pack RGB channels (last dimension) into 24-bit integer codes"""
+    if rgb.shape[-1] != 3:
+        raise ValueError(f'RGB array shape: {rgb.shape}. Last dimension must hold 3 channels')
+    if rgb.dtype != np.uint8:
+        if rgb.min() < 0 or rgb.max() > 255:
+            raise ValueError('RGB values must be in the range 0-255')
+        rgb = rgb.astype(np.uint8)
+    codes = rgb[..., 0].astype(np.uint32, order='C') << 16
+    codes |= rgb[..., 1].astype(np.uint32) << 8
+    codes |= rgb[..., 2]
+    return codes
+
+
+def profile_hash(colour_profile):
+    """Return a hash identifying a colour profile"""
+    arr = np.ascontiguousarray(colour_profile, dtype=np.int64)
+    return hashlib.sha1(str(arr.shape).encode() + arr.tobytes()).hexdigest()
+
+
+_LUTS = OrderedDict()  # tables loaded in memory, most recently used last
+_LUTS_LOCK = threading.Lock()  # tables are requested by several threads (e.g. batch queue and GUI)
+MAX_LUTS_IN_MEMORY = 8
+DEFAULT_MAX_BYTES = 16 * 2 ** 24  # 16 tables of 8-bit indices (256 MB)
+
+
+def lut_dir():
+    """Set directory of cached lookup tables"""
+    return data_utils.cache_dir() / 'lut'
+
+
+def get_max_bytes():
+    """Size cap of the cached lookup tables, from settings if any"""
+    max_bytes = settings.get_settings('LUT_CACHE_MAX_BYTES')
+    return int(max_bytes[0]) if max_bytes else DEFAULT_MAX_BYTES
+
+
+def get_rgb_lut(colour_profile):
+    """Return the lookup table of a colour profile, from memory, from disk or newly created
+    Args:
+        colour_profile: (H, 3) array of RGB values of the colour bar
+    Returns: RgbLut instance
+    """
+    key = profile_hash(colour_profile)
+    with _LUTS_LOCK:
+        if key in _LUTS:
+            _LUTS.move_to_end(key)
+            return _LUTS[key]
+        path = lut_dir() / f'{key}.npy'
+        try:
+            table = np.load(path)
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError):  # not cached, or evicted meanwhile
+            table = None
+        lut = RgbLut(colour_profile, table)
+        _LUTS[key] = lut
+        if len(_LUTS) > MAX_LUTS_IN_MEMORY:
+            _LUTS.popitem(last=False)
+        return lut
+
+
+def save_rgb_lut(lut):
+    """Save lookup table to disk if new entries were computed"""
+    if not lut.modified:
+        return
+    dir_path = lut_dir()
+    dir_path.mkdir(parents=True, exist_ok=True)
+    path = dir_path / f'{lut.key}.npy'
+    tmp_path = dir_path / f'{lut.key}.{os.getpid()}.tmp.npy'
+    np.save(tmp_path, lut.table)
+    os.replace(tmp_path, path)  # atomic, so that other processes never read a partial table
+    lut.modified = False
+    evict(get_max_bytes(), keep=path)
+
+
+def entries():
+    """List cached lookup tables with their size and time of last use"""
+    items = []
+    for path in lut_dir().glob('*.npy'):
+        if path.name.endswith('.tmp.npy'):
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        items.append((stat.st_mtime, stat.st_size, path))
+    return sorted(items)
+
+
+def evict(max_bytes, keep=None):
+    """Delete least recently used tables until cached tables take at most max_bytes
+    Args:
+        max_bytes (int): size to reach
+        keep: path of a table that should not be deleted
+    Returns: None
+    """
+    items = [item for item in entries() if item[2] != keep]
+    total = sum(size for _, size, _ in items) + (keep.stat().st_size if keep is not None and keep.exists() else 0)
+    for _, size, path in items:
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except OSError:  # already deleted by another process
+            pass
+        total -= size
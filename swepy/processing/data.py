@@ -1,7 +1,5 @@
-import tkinter
 from pathlib import Path
 
-import detecta
 import numpy as np
 import scipy.io as sio
 from pydicom import dcmread
@@ -9,9 +7,15 @@ from pydicom.pixel_data_handlers.util import convert_color_space
 from skimage.draw import polygon
 
 from src.src_utils import get_project_root
-from swepy.app import app_utils
-from swepy.processing import data_utils
+from swepy.processing import (catalogue, colour_bar, colour_lut, data_utils, frame_cache, memory, parallel,
+                              results, results_store, stats, swe_frames)
+from swepy.processing.swe_map import SweMap
 from swepy.processing.data_utils import mean_lowest_stdev_subarray
+from swepy.processing.frames import LazyFrames
+
+
+class NoSweDataError(ValueError):
+    """Raised when no elastography data are found in the analysed region"""
 
 
 class DcmData:
@@ -23,6 +27,7 @@ class DcmData:
         self.path = path
         self.img_name = None
         self.ds = None
+        self.file_id = None
         self.img_array = None
         self.top_fov = None  # top field of view
         self.swe = None  # SWE box
@@ -30,26 +35,29 @@ class DcmData:
         self.swe_array = None
         self.roi_coords = None
         self.roi_shape = None
+        self.roi_name = None  # None for a single unnamed ROI
         self.top_fov_coords = None
         self.bmode_fhz = None
         self.swe_fhz = None
+        self.detected_swe_fhz = None  # frequency of SWE updates estimated from frames
+        self.swe_fhz_confidence = None  # 0 to 1, None if not estimated
         self.max_scale = None
-        if tkinter._default_root is not None:
-            self.sat_thresh_var = tkinter.IntVar()
-            self.set_saturated_threshold()
+        self.detected_max_scale = None  # read from the label of the colour bar
+        self.max_scale_score = None  # lowest correlation of digits of the label with digit templates
+        self.colour_bar = None  # x0, y0, x1, y1 (exclusive) of the colour bar
+        self.colour_profile = None
+        self.real_values = None
+        self.rgb_lut = None
+        self.swe_map = None  # colour profile indices of the whole SWE box
         self.analysis_swe_var = None
+        self.cmap_loc = None
+        self.sat_thresh = 98  # % of max scale above which pixels are considered saturated
         self.results = None
 
         self.void_threshold = 150  # value used in Elastogui
-
-    def set_saturated_threshold(self):
-        """Try and read the percentage of the max scale to use as a threshold
-        above which pixels are considered saturated"""
-        sat_thresh = data_utils.get_settings('SAT_THRESH')
-        if sat_thresh:
-            self.sat_thresh_var.set(sat_thresh[0])
-        else:
-            self.sat_thresh_var.set(98)  # set default value to 98%
+        self.workers = None  # threads mapping colours, see parallel.get_workers
+        self.max_bytes = None  # memory budget of analyses, see memory.get_max_bytes
+        self.progress = None  # function (done, total) notified of processed frames, may raise to stop processing
 
     def get_img_name(self):
         if self.path:
@@ -73,15 +81,35 @@ class DcmData:
         coords = [(start_x, start_y), (stop_x, stop_y)]
         return coords
 
-    def load_dicom(self):
-        """Retrieve DICOM image and key metadata"""
+    def read_header(self):
+        """Retrieve key metadata without reading pixel data, e.g. to look for stored results"""
         self.get_img_name()
-        self.ds = dcmread(self.path)
+        self.ds = dcmread(self.path, stop_before_pixels=True)
+        self.set_metadata()
+
+    def set_metadata(self):
+        self.file_id = data_utils.file_identity(self.path, str(self.ds.get('SOPInstanceUID', '')))
         self.define_rois()
         self.roi_coords = self.get_roi_coord(self.swe)
         self.top_fov_coords = self.get_roi_coord(self.top_fov)
         self.bmode_fhz = float(self.ds.RecommendedDisplayFrameRate)
-        img_array_raw = self.ds.pixel_array
+
+    def load_dicom(self, use_cache=True):
+        """Retrieve DICOM image and key metadata
+        Args:
+            use_cache (bool): read decoded frames from (and save them to) the frame cache
+        Returns: None
+        """
+        self.get_img_name()
+        self.ds = dcmread(self.path)
+        self.set_metadata()
+        # frames are decoded on access, instead of decoding the whole loop with self.ds.pixel_array
+        frame_bytes = int(self.ds.Rows) * int(self.ds.Columns) * int(self.ds.SamplesPerPixel) * \
+            max(int(self.ds.BitsAllocated) // 8, 1)
+        img_array_raw = LazyFrames.from_dataset(self.ds, cache_size=memory.cached_frames(frame_bytes, self.max_bytes))
+        if use_cache:
+            img_array_raw.decoder.store = frame_cache.open_frames(self.file_id, img_array_raw.shape,
+                                                                  img_array_raw.dtype)
         # if (0x0008, 0x2111) in self.ds and 'Lossy' in self.ds[
         #     0x0008, 0x2111].value:  # check if there was lossy compression
         #     self.img_array = convert_color_space(img_array_raw, 'YBR_FULL_422', 'RGB', per_frame=True)
@@ -89,67 +117,76 @@ class DcmData:
         #     self.img_array = img_array_raw
         self.img_array = img_array_raw  # disabled above code 20250117 as it no longer seemed required
 
-    def detect_unique_swe(self):
-        """Retrieve indices of frames with unique SWE ROI"""
-        all_rois = self.get_rois(self.img_array)
-        mean_colour = all_rois.mean(axis=(1, 2))
-        colour_shifts = np.diff(mean_colour)
-        indices = detecta.detect_peaks(x=abs(colour_shifts),
-                                       # mph=np.std(colour_shifts) * 0.1,
-                                       edge='both',
-                                       show=False)
-        # indices = np.where(abs(colour_shifts) > 0.04)[0] + 1  # used 0.024 in files from Aixplorer
+    def detect_unique_swe(self, n_frames=None):
+        """Retrieve indices of frames following a change of SWE data, comparing the SWE box of consecutive frames
+        in one pass over frames decoded one at a time
+        Args:
+            n_frames (int): number of frames to inspect from the start of the sequence. All frames if None
+        Returns: indices of frames following a change of SWE data
+        """
+        frames = self.img_array
+        if n_frames is not None:
+            frames = frames.subset(np.arange(min(n_frames, len(frames))))
+        scores = list(swe_frames.change_scores(self.report_progress(frames), self.swe_box(), self.void_threshold))
+        indices = swe_frames.swe_changes(scores)
+        self.detected_swe_fhz, self.swe_fhz_confidence = swe_frames.estimate_swe_rate(scores, indices,
+                                                                                     self.bmode_fhz)
         return indices
 
-    def resample(self, swe_fhz=1.0):
-        """resample scan sequence to only retain 1st scans with unique SWE data"""
-        unique_swes = self.detect_unique_swe()
-        if self.bmode_fhz % swe_fhz == 0:
-            frame_step = int(self.bmode_fhz // swe_fhz)
-        else:
-            frame_step = int(self.bmode_fhz // swe_fhz + 1)
-
-        # NB: 2nd frame comes at indices between 1 and 5
-        first_updated_frame = unique_swes[0] if unique_swes[0] < frame_step else frame_step + 1
-        swe_indices = np.arange(start=first_updated_frame, stop=self.img_array.shape[0],
-                                step=frame_step)  # only works for sequences!
-        # swe_indices = np.insert(swe_indices, 0, 0)
-        self.swe_array = self.img_array[swe_indices, :, :]
+    def report_progress(self, frames):
+        """Iterate over frames, notifying self.progress of each processed frame"""
+        for i, frame in enumerate(frames, start=1):
+            yield frame
+            if self.progress is not None:
+                self.progress(i, len(frames))
+
+    def resample(self, swe_fhz=None):
+        """resample scan sequence to only retain 1st scans with unique SWE data
+        Args:
+            swe_fhz (float): acquisition frequency of SWE frames, only used if changes of SWE data are not found.
+                Estimated from frames if None
+        Returns: frames following a change of SWE data
+        """
+        self.swe_fhz = swe_fhz
+        swe_indices = self.detect_unique_swe()
+        if len(swe_indices) == 0 or len(swe_indices) == len(self.img_array) - 1:
+            # no change found, or a change at every frame (e.g. noisy colours): fixed step from SWE fhz
+            swe_fhz = swe_fhz or self.detected_swe_fhz
+            if not swe_fhz:
+                raise NoSweDataError('Changes of SWE data were not found, SWE fhz is needed')
+            frame_step = int(np.ceil(self.bmode_fhz / swe_fhz))
+            swe_indices = np.arange(start=frame_step + 1, stop=len(self.img_array), step=frame_step)
+        self.swe_array = self.img_array.subset(swe_indices)
         return self.swe_array
 
-    def get_rois(self, img_arr):
-        """Index sub-array of image frames at SWE ROI coordinates"""
-        if len(self.roi_coords) > 2:
-            self.roi_shape = 'polygon'
-            coords = self.roi_coords
-        else:
-            self.roi_shape = 'rectangle'
-            coords = data_utils.rect_polygonise(self.roi_coords)
+    @staticmethod
+    def roi_pixels(roi_coords):
+        """Return x and y image coordinates of pixels in a ROI (rectangle corners or polygon vertices)"""
+        coords = roi_coords if len(roi_coords) > 2 else data_utils.rect_polygonise(roi_coords)
         coords_arr = np.asarray(coords)
         rr, cc = polygon(coords_arr[:, 0], coords_arr[:, 1])
-        return img_arr[:, cc, rr, :]
+        return rr, cc
 
-    def calc_pixel_percent(self, target):
-        dims = self.filtered_values.shape
-        total_count = np.full(dims[0], dims[1])
-        count = np.count_nonzero(target, axis=1)
-        pixel_percent = (count / total_count) * 100
-        return pixel_percent
+    def get_rois(self, img_arr):
+        """Index sub-array of image frames at SWE ROI coordinates"""
+        self.roi_shape = 'polygon' if len(self.roi_coords) > 2 else 'rectangle'
+        rr, cc = self.roi_pixels(self.roi_coords)
+        return img_arr[:, cc, rr, :]
 
-    def void_filter(self):
+    def void_filter(self, rgb_arr=None):
         """Create mask of void pixels in image array
         Args:
-            img_roi: 3D image array with RGB channels in 3rd dimension
-            threshold (int): user defined threshold of cumulative difference between channels
+            rgb_arr: array with RGB channels in the last dimension. Default: self.rois
         Returns: mask of void pixels
         """
         # assign threshold to max value (3*255) if it is None
         threshold = self.void_threshold if isinstance(self.void_threshold, int) else 765
-        arr = np.copy(self.rois)
-        # NB: important to convert channel values to float before calculations
-        r = arr[:, :, 0].astype(np.float32)
-        g = arr[:, :, 1].astype(np.float32)
-        b = arr[:, :, 2].astype(np.float32)
+        arr = self.rois if rgb_arr is None else rgb_arr
+        # NB: important to convert channel values to a signed type before calculations (int16 holds differences
+        # of 8-bit values exactly, with half the memory of float32)
+        r = arr[..., 0].astype(np.int16)
+        g = arr[..., 1].astype(np.int16)
+        b = arr[..., 2].astype(np.int16)
         rg_diff = np.abs(np.subtract(r, g))
         rb_diff = np.abs(np.subtract(r, b))
         gb_diff = np.abs(np.subtract(g, b))
@@ -166,69 +203,334 @@ class DcmData:
         scaled_cmap = np.flip(scaled_cmap, 0)
         return scaled_cmap
 
-    def set_colour_scale(self, cmap_loc):
+    def set_colour_scale(self, cmap_loc, mapping='lut'):
         """
         Thin colour map to one pixel width and set matching scale based on max. scale value
+        Args:
+            cmap_loc (str): source of colour map, 'local_cmap' or 'external_cmap'
+            mapping (str): method used to map RGB values to the colour profile, 'lut' or 'brute_force'
         Returns: colour profile and corresponding "real values" of velocity or modulus
         """
         if cmap_loc == 'local_cmap':
-            colour_bar = {'x0': 693, 'y0': 70, 'x1': 701, 'y1': 180}  # retrieved manually from IJ
-            scale_arr = self.img_array[0][colour_bar['y0']:colour_bar['y1'],
-                        colour_bar['x0']:colour_bar['x1'],
-                        :]
+            if self.colour_bar is None:
+                self.locate_colour_bar()
+            x0, y0, x1, y1 = self.colour_bar
+            scale_arr = self.img_array[0][y0:y1, x0:x1, :]
             # 2D array for single pxl colour scale, with width 3 (r, g, b)
             self.colour_profile = scale_arr.mean(axis=1, dtype=int)
         elif cmap_loc == 'external_cmap':
             self.colour_profile = self.get_external_cmap()  # reference to a standard colour map (Elastogui)
-        # 1D array of values matching colour profile (velocity or modulus)
-        self.real_values = np.linspace(self.max_scale, 0, self.colour_profile.shape[0])
-
-    def analyse_roi(self, cmap_loc):
-        """Calculate stat parameter of interest for ROIs of each frame"""
-        self.rois = self.get_rois(self.swe_array)
-        self.set_colour_scale(cmap_loc)
-        filter_mask = self.void_filter()
-        indices = data_utils.closest_rgb(self.rois, self.colour_profile)
-        self.mapped_values = self.real_values[indices]
-        self.filtered_values = np.where(filter_mask, self.mapped_values, np.nan)
-
-        saturated_pxls = self.filtered_values > self.max_scale * self.sat_thresh_var.get() / 100
-        self.saturated_percent = self.calc_pixel_percent(saturated_pxls)
-
-        voided_pxls = np.isnan(self.filtered_values)
-        self.void_percent = self.calc_pixel_percent(voided_pxls)
-        if np.all(self.void_percent == 100):
-            app_utils.warn_no_swe_data()
-            exit()
+        self.set_real_values(self.colour_profile.shape[0])
+        if mapping == 'lut':
+            # lookup table built once per colour profile and reused across files and analyses
+            self.rgb_lut = colour_lut.get_rgb_lut(self.colour_profile)
+
+    def locate_colour_bar(self, read_label=False):
+        """Locate the colour bar in the first frame, or from the location cached for the device model and geometry
+        of ultrasound regions (without loading frames), and read the max. scale from its label
+        Args:
+            read_label (bool): read the max. scale (self.detected_max_scale) and its score (self.max_scale_score),
+                loading frames if needed
+        Returns: None
+        """
+        location = colour_bar.cached_location(self.ds)
+        if location is None or read_label:
+            if self.img_array is None:
+                self.load_dicom()
+            frame = np.asarray(self.img_array[0])
+            location = colour_bar.locate(self.ds, frame, exclude=self.swe_box())
+            if read_label:
+                self.detected_max_scale, self.max_scale_score, _ = colour_bar.read_label(frame, location['bar'],
+                                                                                         location['label'])
+        self.colour_bar = tuple(location['bar'])
+
+    def check_estimates(self):
+        """Check the max. scale read from the colour bar and the SWE fhz estimated from frames
+        Returns: list of warnings, empty if both are reliable (or not used)
+        """
+        warnings = []
+        if self.detected_max_scale and self.max_scale_score is not None:
+            if self.max_scale == self.detected_max_scale and self.max_scale_score < colour_bar.LOW_LABEL_SCORE:
+                warnings.append(f'max. scale read from the colour bar ({self.max_scale:g}) is uncertain '
+                                f'(score: {self.max_scale_score:.2f}), please check')
+            elif self.max_scale != self.detected_max_scale and self.max_scale_score >= colour_bar.LOW_LABEL_SCORE:
+                warnings.append(f'max. scale ({self.max_scale:g}) differs from the colour bar '
+                                f'({self.detected_max_scale:g}), please check')
+        if self.swe_fhz_confidence is not None and self.swe_fhz_confidence < swe_frames.LOW_CONFIDENCE:
+            estimate = f'{self.detected_swe_fhz:.2f} Hz' if self.detected_swe_fhz else 'none'
+            warnings.append(f'SWE updates are not periodic (estimated SWE fhz: {estimate}, '
+                            f'confidence: {self.swe_fhz_confidence:.2f}), please check SWE frames')
+        return warnings
+
+    def set_real_values(self, n_values):
+        """Set 1D array of values matching colour profile (velocity or modulus), from max. scale to 0"""
+        self.real_values = np.linspace(self.max_scale, 0, n_values)
+
+    def map_colours(self, rgb_arr, mapping='lut'):
+        """Get indices of the closest colour profile entries for an array of RGB values
+        Args:
+            rgb_arr: array with RGB channels in the last dimension
+            mapping (str): 'lut' for a lookup table, 'brute_force' to search the whole colour profile for each pixel
+        Returns: array of colour profile indices
+        """
+        if mapping == 'lut':
+            return self.rgb_lut.closest_rgb(rgb_arr)
+        elif mapping == 'brute_force':
+            return data_utils.closest_rgb(rgb_arr, self.colour_profile)
         else:
-            self.gen_results()
+            raise ValueError(f"mapping: {mapping}. Must be 'lut' or 'brute_force'")
+
+    def encode_colours(self, frames, pixel_key, mapping='lut'):
+        """Map colours of pixels of frames to colour profile indices, with void pixels set to the number of colour
+        profile values (see results.encode_indices).
+        Frames are read and mapped in batches sized to the memory budget (self.max_bytes), and each batch is split
+        among parallel threads (self.workers)
+        Args:
+            frames: array or LazyFrames of RGB frames, e.g. resampled SWE frames
+            pixel_key (tuple): index of pixels in each frame, e.g. slices of the SWE box or rows and columns of a ROI
+            mapping (str): method used to map RGB values to the colour profile, 'lut' or 'brute_force'
+        Returns: array of encoded colour profile indices, of shape (frames,) + shape of indexed pixels
+        """
+        if mapping not in ('lut', 'brute_force'):
+            raise ValueError(f"mapping: {mapping}. Must be 'lut' or 'brute_force'")
+        n_values = self.colour_profile.shape[0]
+        pixel_shape = np.broadcast_to(np.zeros((), np.uint8), frames.shape[1:])[pixel_key].shape[:-1]  # no copy
+        indices = np.empty((len(frames),) + pixel_shape, dtype=np.min_scalar_type(n_values))
+        # encoded indices and the SWE map (kept while ROIs outside the SWE box are encoded) take part of the budget
+        held_bytes = indices.nbytes + (self.swe_map.indices.nbytes if self.swe_map is not None else 0)
+        max_bytes = max((self.max_bytes or memory.get_max_bytes()) - held_bytes, 0)  # one frame per batch if 0
+        batch = memory.frames_per_batch(int(np.prod(pixel_shape)), memory.bytes_per_pixel(mapping, n_values),
+                                        max_bytes)
+
+        def encode(chunk):
+            return results.encode_indices(self.map_colours(chunk, mapping), self.void_filter(chunk), n_values)
+
+        for start in range(0, len(frames), batch):
+            rgb = np.asarray(frames[(slice(start, start + batch),) + pixel_key])
+            rgb = rgb.reshape(len(rgb), -1, 3)  # (frames, pixels, 3)
+            indices[start:start + batch] = parallel.map_chunks(encode, rgb, self.workers).reshape((-1,) + pixel_shape)
+            if self.progress is not None:
+                self.progress(min(start + batch, len(frames)), len(frames))
+        if mapping == 'lut':
+            colour_lut.save_rgb_lut(self.rgb_lut)  # once, after all threads
+        return indices
+
+    def swe_box(self):
+        """Return x0, y0, x1, y1 image coordinates of the SWE box (inclusive)"""
+        height, width = self.img_array.shape[1:3]
+        return (max(int(self.swe.RegionLocationMinX0), 0), max(int(self.swe.RegionLocationMinY0), 0),
+                min(int(self.swe.RegionLocationMaxX1), width - 1), min(int(self.swe.RegionLocationMaxY1), height - 1))
+
+    def update_swe_map(self, mapping='lut'):
+        """Map the colours of the whole SWE box of resampled frames, unless they are mapped already
+        (set_colour_scale must be called first)
+        Args:
+            mapping (str): method used to map RGB values to the colour profile, 'lut' or 'brute_force'
+        Returns: SweMap instance
+        """
+        key = (tuple(self.swe_array.indices), colour_lut.profile_hash(self.colour_profile), self.void_threshold)
+        if self.swe_map is not None and self.swe_map.key == key:
+            return self.swe_map
+        self.swe_map = None  # released before the new map is encoded
+        x0, y0, x1, y1 = self.swe_box()
+        indices = self.encode_colours(self.swe_array, (slice(y0, y1 + 1), slice(x0, x1 + 1)), mapping)
+        self.swe_map = SweMap(indices, (x0, y0), self.colour_profile.shape[0], key)
+        return self.swe_map
+
+    def roi_summary(self, roi_coords):
+        """Median and mean of all frames in a ROI, read from the SWE map (e.g. while the ROI is drawn)
+        Args:
+            roi_coords: rectangle corners or polygon vertices
+        Returns: median and mean in the unit of the colour scale, None if the ROI is not in the mapped SWE box
+        """
+        if self.swe_map is None or self.real_values is None or len(roi_coords) < 2:
+            return None
+        xs, ys = self.roi_pixels(roi_coords)
+        if not self.swe_map.contains(xs, ys):
+            return None
+        median, mean, _ = stats.histogram_stats(self.swe_map.histogram(xs, ys), self.real_values)
+        return median, mean
+
+    def analyse_roi(self, cmap_loc, mapping='lut', sat_thresh=None):
+        """Calculate stat parameter of interest for ROIs of each frame
+        Args:
+            cmap_loc (str): source of colour map, 'local_cmap' or 'external_cmap'
+            mapping (str): method used to map RGB values to the colour profile, 'lut' or 'brute_force'
+            sat_thresh (int): % of max scale above which pixels are saturated. Current value if None
+        Returns: None
+        """
+        if sat_thresh is not None:
+            self.sat_thresh = sat_thresh
+        self.cmap_loc = cmap_loc
+        self.set_colour_scale(cmap_loc, mapping)
+        xs, ys = self.roi_pixels(self.roi_coords)
+        self.update_swe_map(mapping)  # mapped once for all ROIs with the same frames and colour profile
+        self.roi_shape = 'polygon' if len(self.roi_coords) > 2 else 'rectangle'
+        if self.swe_map.contains(xs, ys):
+            # the ROI is a selection of pixels of the mapped SWE box
+            self.indices = self.swe_map.roi_indices(xs, ys)
+        else:
+            # ROI pixels of batches of frames, instead of all frames at once (see get_rois)
+            self.indices = self.encode_colours(self.swe_array, (ys, xs), mapping)
+        self.calc_stats()
+
+    def calc_stats(self):
+        """Calculate stats from colour profile indices of the ROI (self.indices) and values of the colour profile.
+        Indices do not depend on max. scale, SWE variable or saturation threshold, so changes of these parameters
+        only require this step.
+        """
+        n_values = self.real_values.shape[0]
+        filter_mask = self.indices < n_values
+
+        # pixels can only take the values of the colour profile, so stats are calculated from histograms
+        self.histograms = stats.index_histograms(self.indices, filter_mask, n_values)
+        n_pixels = filter_mask.shape[1]
+        self.saturated_percent = stats.saturated_percent(self.histograms, self.real_values,
+                                                         self.max_scale * self.sat_thresh / 100, n_pixels)
+        self.void_percent = stats.void_percent(self.histograms, n_pixels)
+        if np.all(self.void_percent == 100):
+            raise NoSweDataError('No elastography data were found in the current selection')
+        self.gen_results()
+
+    def analyse_rois(self, rois, cmap_loc, mapping='lut', sat_thresh=None):
+        """Analyse several named ROIs in one pass: the colours of the SWE box are mapped once, and ROIs analysed
+        before with the same parameters are loaded from the results store (or recalculated from stored indices if
+        only max. scale, SWE variable or saturation threshold differ). Frames are only loaded (and resampled
+        at self.swe_fhz) if the colours of a ROI need to be mapped.
+        Args:
+            rois (dict): ROI name: ROI coordinates (rectangle corners or polygon vertices)
+            cmap_loc (str): source of colour map, 'local_cmap' or 'external_cmap'
+            mapping (str): method used to map RGB values to the colour profile, 'lut' or 'brute_force'
+            sat_thresh (int): % of max scale above which pixels are saturated. Current value if None
+        Yields: name of each ROI and key of its stored results, once its results are set (self.results, etc.)
+        """
+        if cmap_loc == 'local_cmap' and self.colour_bar is None:
+            self.locate_colour_bar()  # part of the analysis parameters
+        for name, coords in rois.items():
+            self.roi_name = name
+            self.roi_coords = coords
+            key = self.load_stored_results(cmap_loc, sat_thresh=sat_thresh)
+            if not key and self.rescale_stored_results():
+                key = self.save_results()
+            if not key:
+                if self.swe_array is None:
+                    if self.img_array is None:  # e.g. loaded already to read the colour bar
+                        self.load_dicom()
+                        self.roi_coords = coords
+                    self.resample(self.swe_fhz)
+                self.analyse_roi(cmap_loc, mapping, sat_thresh)
+                key = self.save_results()
+            yield name, key
 
     def gen_results(self):
-        """Generate 3 sets of results for velocity, shear and Young's modulus"""
+        """Generate 3 sets of results for velocity, shear and Young's modulus.
+        Raw values are only stored as colour profile indices and converted to each variable on demand"""
         target_vars = ['velocity', 'shear_m', 'youngs_m']
-        d = {'file': [self.path.stem, self.path.parent],
-             'roi_coords': self.roi_coords,
-             'roi_shape': self.roi_shape,
-             'raw': {},
-             'stats': {}}
+        raw = results.RawValues(self.indices, self.real_values, self.analysis_swe_var)
+        d = results.SweResults(file=[self.path.stem, self.path.parent],
+                               roi_coords=self.roi_coords,
+                               roi_shape=self.roi_shape,
+                               stats={},
+                               raw=raw,
+                               roi_name=self.roi_name)
         d['stats']['%_void'] = self.void_percent
-        d['stats'][f'%_saturated (> {self.sat_thresh_var.get()}% maxscale)'] = self.saturated_percent
+        d['stats'][f'%_saturated (> {self.sat_thresh}% maxscale)'] = self.saturated_percent
         for target_var in target_vars:
-            if target_var == self.analysis_swe_var:
-                d['raw'][target_var] = self.filtered_values
-            else:
-                d['raw'][target_var] = data_utils.convert_swe(self.filtered_values,
-                                                              self.analysis_swe_var,
-                                                              target_var)
-            filtered = d['raw'][target_var]
-            d['stats']['_'.join((target_var, 'median'))] = np.nanmedian(filtered, axis=1)
-            d['stats']['_'.join((target_var, 'mean'))] = np.nanmean(filtered, axis=1)
-            d['stats']['_'.join((target_var, 'SD'))] = np.nanstd(filtered, axis=1)
+            # conversion of the colour profile values only, instead of every pixel
+            median, mean, sd = stats.histogram_stats(self.histograms, raw.scale_values(target_var))
+            d['stats']['_'.join((target_var, 'median'))] = median
+            d['stats']['_'.join((target_var, 'mean'))] = mean
+            d['stats']['_'.join((target_var, 'SD'))] = sd
         self.results = d
-        self.mean = np.nanmean(self.filtered_values)
-        self.mean_low_stdev, mask = mean_lowest_stdev_subarray(self.filtered_values, return_mask=True)
+        self.median, self.mean, _ = stats.histogram_stats(self.histograms.sum(axis=0), self.real_values)
+        frame_means = d['stats']['_'.join((self.analysis_swe_var, 'mean'))]
+        self.mean_low_stdev, mask = mean_lowest_stdev_subarray(frame_means, return_mask=True)
         d['stats']['Low stdev subarray'] = mask
-        self.median = np.nanmedian(self.filtered_values)
+
+    def analysis_params(self):
+        """Parameters defining the results of an analysis, in JSON serialisable form"""
+        return {'roi_name': self.roi_name,
+                'roi_coords': [[int(v) for v in coord] for coord in self.roi_coords],
+                'swe_fhz': float(self.swe_fhz) if self.swe_fhz else None,
+                'max_scale': float(self.max_scale),
+                'swe_var': self.analysis_swe_var,
+                'cmap_loc': self.cmap_loc,
+                'colour_bar': [int(v) for v in self.colour_bar] if self.cmap_loc == 'local_cmap' else None,
+                'sat_thresh': int(self.sat_thresh)}
+
+    def results_key(self):
+        """Key of the results of the file analysed with the current parameters"""
+        return results_store.analysis_key(self.file_id, self.analysis_params())
+
+    def indices_key(self):
+        """Key shared by results with the same colour profile indices, i.e. differing only by max. scale,
+        SWE variable or saturation threshold"""
+        params = {k: v for k, v in self.analysis_params().items() if k not in ('max_scale', 'swe_var', 'sat_thresh')}
+        return results_store.analysis_key(self.file_id, params)
+
+    def load_stored_results(self, cmap_loc, sat_thresh=None):
+        """Load results of a previous analysis of the file with the same parameters, if they are stored
+        Args:
+            cmap_loc (str): source of colour map, 'local_cmap' or 'external_cmap'
+            sat_thresh (int): % of max scale above which pixels are saturated. Current value if None
+        Returns: key of the stored results, None if there are none
+        """
+        if sat_thresh is not None:
+            self.sat_thresh = sat_thresh
+        self.cmap_loc = cmap_loc
+        key = self.results_key()
+        if not results_store.contains(key):
+            return None
+        try:
+            summary = results_store.load_meta(key)['summary']
+            self.results = results_store.load_results(key)
+            self.median, self.mean, self.mean_low_stdev = (summary[k] for k in ('median', 'mean', 'mean_low_stdev'))
+        except (OSError, ValueError, KeyError):  # entry deleted or incomplete
+            return None
+        self.restore_estimates(summary)
+        self.roi_shape = self.results['roi_shape']
+        self.indices = self.results['raw'].indices
+        self.real_values = self.results['raw'].real_values
+        return key
+
+    def rescale_stored_results(self):
+        """Calculate results from the colour profile indices of stored results that only differ by max. scale,
+        SWE variable or saturation threshold, without decoding or mapping colours (see load_stored_results)
+        Returns: True if results were calculated
+        """
+        key = results_store.find_indices(self.indices_key())
+        if not key:
+            return False
+        try:
+            meta = results_store.load_meta(key)
+            indices, real_values = results_store.load_raw(key)
+        except (OSError, ValueError, KeyError):
+            return False
+        self.roi_shape = meta['roi_shape']
+        self.restore_estimates(meta['summary'])
+        self.indices = indices
+        self.set_real_values(real_values.shape[0])
+        self.calc_stats()
+        return True
+
+    def restore_estimates(self, summary):
+        """Set the SWE fhz estimated from frames when stored results were calculated, as frames are not inspected
+        again (see check_estimates)"""
+        if self.swe_fhz_confidence is None:
+            self.detected_swe_fhz = summary.get('detected_swe_fhz')
+            self.swe_fhz_confidence = summary.get('swe_fhz_confidence')
+
+    def save_results(self):
+        """Store results and list them in the catalogue of analyses
+        Returns: key of the stored results
+        """
+        summary = {'median': float(self.median), 'mean': float(self.mean),
+                   'mean_low_stdev': float(self.mean_low_stdev),
+                   'detected_swe_fhz': self.detected_swe_fhz, 'swe_fhz_confidence': self.swe_fhz_confidence}
+        key = results_store.save_results(self.results, self.results_key(), summary, indices_key=self.indices_key())
+        catalogue.add_analysis(self, key)
+        catalogue.delete(results_store.evict(keep=key))
+        return key
 
 
 if __name__ == '__main__':
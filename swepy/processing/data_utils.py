@@ -1,141 +1,44 @@
-import webbrowser
-from pathlib import Path
+import hashlib
+import os
 
 import numpy as np
-from matplotlib.colors import LinearSegmentedColormap
 
-from swepy.processing.io.json_io import load_json, save_json
-from swepy.processing.io.pickle_io import save_pickle
+from src.src_utils import get_project_root
 
 
 # warnings.simplefilter('ignore')  # Fix NumPy issues.
 
 
-def settings_io(temp=None):
-    """Load settings from previous analyses"""
-    dir_path = Path.cwd().parent / 'src' / 'cache'
-    json_path = dir_path / 'settings.json'
+def cache_dir():
+    """Directory of cached settings and results, independent of the working directory"""
+    return get_project_root() / 'src' / 'cache'
 
-    if temp:
-        save_json(temp, json_path)
-    else:
-        if json_path.exists():
-            temp = load_json(json_path)
-            return temp
-            # if param in temp:
-            #     return temp[param]
-        else:
-            return {}
-
-
-def get_settings(param):
-    """Load a parameter settings from previous analyses"""
-    temp = settings_io()
-    if param in temp:
-        return temp[param]
-    else:
-        return []
 
-
-def delete_settings(param=None):
-    """Delete a parameter settings or all settings from previous analyses
+def file_fingerprint(path, block_size=2 ** 20):
+    """Fast fingerprint of a file, based on its size and the content of its first and last blocks
     Args:
-        param: parameter for which settings should be deleted
-    Returns: None
+        path: path to file
+        block_size (int): number of bytes read at each end of the file
+    Returns: hexadecimal hash string
     """
-    temp = settings_io()
-    if param:
-        temp[param].clear()
-    else:
-        for parameter in temp.values:
-            parameter.clear()
-    settings_io(temp)
-
-
-def set_settings_paths():
-    """Set path for json file containing settings"""
-    dir_path = Path.cwd().parent / 'src' / 'cache'
-    json_path = dir_path / 'settings.json'
-    return dir_path, json_path
-
-
-def save_path(path):
-    """Add file path to a list of recent file paths, in a JSON file"""
-    dir_path, json_path = set_settings_paths()
-    if json_path.exists():
-        temp = load_json(json_path)
-        if path in temp['RECENT_PATHS']:
-            return
-    elif dir_path.exists():
-        temp = dict()
-        temp['RECENT_PATHS'] = []
-    else:
-        dir_path.mkdir()
-        temp = dict()
-        temp['RECENT_PATHS'] = []
-
-    temp['RECENT_PATHS'].insert(0, path)
-    if len(temp['RECENT_PATHS']) > 10:
-        del temp['RECENT_PATHS'][-1]
-    save_json(temp, json_path)
-
-
-def save_usr_input(fhz, scale):
-    """Save SWE frequency and max. scale from colour bar"""
-    dir_path, json_path = set_settings_paths()
-    if json_path.exists():
-        temp = load_json(json_path)
-        temp['SWE_PARAM'] = [fhz, scale]
-        save_json(temp, json_path)
-
-
-def save_roi_coords(roi_coords):
-    """Save roi coordinates from 1st analysed file"""
-    dir_path, json_path = set_settings_paths()
-    if json_path.exists():
-        temp = load_json(json_path)
-        temp['ROI_COORDS'] = [roi_coords]
-        save_json(temp, json_path)
-
-
-def save_swe_var(swe_var):
-    """Save SWE variable chosen by user"""
-    dir_path, json_path = set_settings_paths()
-    if json_path.exists():
-        temp = load_json(json_path)
-        temp['SWE_VAR'] = [swe_var]
-        save_json(temp, json_path)
-
-
-def save_cmap_source(cmap_loc):
-    """Save cmap preference"""
-    dir_path, json_path = set_settings_paths()
-    if json_path.exists():
-        temp = load_json(json_path)
-        temp['CMAP_LOC'] = [cmap_loc]
-        save_json(temp, json_path)
-
-
-def save_sat_thresh(sat_thresh):
-    """Save chosen saturation level"""
-    dir_path, json_path = set_settings_paths()
-    if json_path.exists():
-        temp = load_json(json_path)
-        temp['SAT_THRESH'] = [sat_thresh]
-        save_json(temp, json_path)
-
-
-def pickle_results(file_path, data):
-    """Add analysis results to a pickle file
+    size = os.path.getsize(path)
+    fingerprint = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as file:
+        fingerprint.update(file.read(block_size))
+        if size > block_size:
+            file.seek(max(size - block_size, block_size))
+            fingerprint.update(file.read())
+    return fingerprint.hexdigest()
+
+
+def file_identity(path, uid=''):
+    """Stable identifier of a DICOM file, from its SOPInstanceUID and a fingerprint of its content
     Args:
-        file_path (pathlib.PosixPath): path to analysed file
-        data (dict): analysis results
-    Returns: None
+        path: path to file
+        uid (str): SOPInstanceUID of the file, if known
+    Returns: hexadecimal hash string
     """
-    dir_path = Path.cwd().parent / 'src' / 'cache'
-    pickle_path = dir_path / f'{file_path.stem}.pickle'
-
-    save_pickle(data, pickle_path)
+    return hashlib.sha1(f'{uid}:{file_fingerprint(path)}'.encode()).hexdigest()
 
 
 def closest_rgb(roi_rgb, color_profile_rgb):
@@ -237,11 +140,6 @@ def get_area(coords):
     return l1 * l2
 
 
-def callback(url):
-    """open webpage"""
-    webbrowser.open_new(url)
-
-
 def filter_nans(lists):
     """Filter nan values out of nested lists
     Args:
@@ -265,24 +163,6 @@ def rect_polygonise(rect_coord):
     return [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
 
 
-def stretch_colormap(cmap, n=255):
-    """Interpolate color map to n colors
-
-    Args:
-        cmap: color map to interpolate
-        n: number of colours in the interpolated color map
-
-    Returns:
-        the interpolated color map
-
-    Notes:
-        adapted from https://stackoverflow.com/a/67985432/13147488
-    """
-    cmap_object = LinearSegmentedColormap.from_list('', np.array(cmap) / 255, 256)
-    cmap_interpolated = (cmap_object(np.linspace(0, 1, n)) * 255).astype(np.uint8)
-    return cmap_interpolated[:, :3]
-
-
 def format_str_datetime(dicom_meta):
     """Format string containing date and time information for display
     Args:
@@ -298,27 +178,63 @@ def format_str_datetime(dicom_meta):
     return ' '.join((date, time))
 
 
-def clear_pickle():
-    """Delete pickle files from cache directory"""
-    src_path = Path.cwd().parent / 'src' / 'cache'
-    paths = list(Path(src_path).rglob('*.pickle'))
-    for path in paths:
-        path.unlink()
-
-
 def get_compression_status(ds_value):
     """Indicate if file is compressed based on 'LossyImageCompression' tag of DICOM file"""
     compression = 'yes' if int(ds_value) > 0 else 'no'
     return compression
 
 
-def mean_lowest_stdev_subarray(arr, return_mask=False):
+def rank_stdev_windows(values, window=5):
+    """
+    Rank all windows of successive values by standard deviation, using rolling sums (O(n) for any window length).
+
+    Args:
+        values (numpy.ndarray): 1D array of values, or 2D array with one sequence per row
+            (e.g. per-frame means of several files, padded with NaN).
+        window (int): number of successive values in each window.
+
+    Returns:
+        tuple: A tuple containing:
+            - numpy.ndarray: start indices of the windows, sorted by increasing standard deviation.
+            - numpy.ndarray: the matching standard deviations. Windows containing NaN values are ranked last,
+              with a NaN standard deviation.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[-1]
+    if not 0 < window <= n:
+        raise ValueError(f'Window length {window} must be between 1 and the sequence length ({n})')
+    nans = np.isnan(values)
+    with np.errstate(invalid='ignore'):
+        # centre values so that sums of squares do not lose precision
+        centred = np.where(nans, 0, values - np.nanmean(values, axis=-1, keepdims=True))
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    sums, squares, nan_counts = (np.pad(np.cumsum(a, axis=-1), pad) for a in (centred, centred ** 2, nans))
+    window_sum = sums[..., window:] - sums[..., :-window]
+    window_squares = squares[..., window:] - squares[..., :-window]
+    window_nans = nan_counts[..., window:] - nan_counts[..., :-window]
+    variance = np.clip(window_squares / window - (window_sum / window) ** 2, 0, None)
+    # rolling sums carry rounding errors: compare variances at a precision relative to the variance of all values
+    # (not SDs, whose errors the square root magnifies near zero), so that the first of equal windows is ranked
+    # first (as with successive np.std calls)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        spread = np.nanvar(values, axis=-1, keepdims=True)
+        ranking_key = np.round(variance / np.where(spread > 0, spread, 1), 10)
+    variance = np.where(ranking_key == 0, 0, variance)  # constant windows
+    stdevs = np.where(window_nans > 0, np.nan, np.sqrt(variance))
+    ranking_key = np.where(window_nans > 0, np.nan, ranking_key)
+    order = np.argsort(ranking_key, axis=-1, kind='stable')  # NaN sorted last
+    return order, np.take_along_axis(stdevs, order, axis=-1)
+
+
+def mean_lowest_stdev_subarray(arr, return_mask=False, window=5):
     """
-    Finds the five successive values in the input array (or its row means if it's 2D) that result in the lowest
-    standard deviation, calculates their average, and returns a boolean mask for the selected values.
+    Finds the five (or `window`) successive values in the input array (or its row means if it's 2D) that result in
+    the lowest standard deviation, calculates their average, and returns a boolean mask for the selected values.
 
     Args:
         arr (numpy.ndarray): A 1D or 2D numpy array of values.
+        return_mask (bool): Also return the mask of selected values.
+        window (int): Number of successive values to select (5 by default).
 
     Returns:
         tuple: A tuple containing:
@@ -326,39 +242,22 @@ def mean_lowest_stdev_subarray(arr, return_mask=False):
             - numpy.ndarray: A 1D boolean mask array indicating the values that are kept.
 
     Raises:
-        ValueError: If the input is a 1D array with fewer than 5 elements, or any row in a 2D array has fewer than 5 elements.
+        ValueError: If the input is not a 1D or 2D array.
     """
-    min_n_frame = 5
-    # Check if the input is a 2D array
     if arr.ndim == 2:
-        if arr.shape[1] < 5:
-            print(f'Video file contains less than 5 frames. Using only {arr.shape[1]} frames.')
-            min_n_frame = arr.shape[1]
-
-        # Compute the mean of each column to form a 1D array
+        # Compute the mean of each row (frame) to form a 1D array
         mean_array = np.nanmean(arr, axis=1)
     elif arr.ndim == 1:
-        if len(arr) < 5:
-            print(f'Video file contains less than 5 frames. Using only {len(arr)} frames.')
-            min_n_frame = len(arr)
-
         mean_array = arr
     else:
         raise ValueError("Input must be a 1D or 2D numpy array")
 
-    # Initialize variables to store the minimum standard deviation and its corresponding subarray
-    min_std_dev = float('inf')
-    best_start_index = None
-
-    # Iterate over possible starting indices for subarrays of length 5 or less
-    for i in range(len(mean_array) - (min_n_frame - 1)):
-        subarray = mean_array[i:i + min_n_frame]  # Get a subarray of consecutive elements
-        std_dev = np.std(subarray)  # Calculate the standard deviation of the subarray
+    min_n_frame = window
+    if len(mean_array) < window:
+        print(f'Video file contains less than {window} frames. Using only {len(mean_array)} frames.')
+        min_n_frame = len(mean_array)
 
-        # Check if the current standard deviation is the smallest found so far
-        if std_dev < min_std_dev:
-            min_std_dev = std_dev
-            best_start_index = i
+    best_start_index = rank_stdev_windows(mean_array, min_n_frame)[0][0]
 
     # Create a boolean mask for the selected values
     mask = np.zeros(len(mean_array), dtype=bool)
@@ -0,0 +1,139 @@
+import os
+import time
+
+import numpy as np
+
+from swepy.processing import data_utils, settings
+
+DEFAULT_MAX_BYTES = 20 * 2 ** 30  # 20 GB
+
+
+def cache_dir():
+    """Set directory of cached decoded frames"""
+    return data_utils.cache_dir() / 'frames'
+
+
+def get_max_bytes():
+    """Size cap of the frame cache, from settings if any"""
+    max_bytes = settings.get_settings('FRAME_CACHE_MAX_BYTES')
+    return int(max_bytes[0]) if max_bytes else DEFAULT_MAX_BYTES
+
+
+class CachedFrames:
+    """Memory-mapped .npy file holding the decoded frames of one DICOM file.
+
+    Frames are written as they get decoded and a mask of decoded frames is kept next to the array, so that
+    partially decoded files are reused as well. Pages of the mapped file are shared between processes.
+    """
+
+    def __init__(self, array_path, frames):
+        self.array_path = array_path
+        self.mask_path = array_path.with_suffix('.decoded.npy')
+        self.frames = frames
+        self.decoded = np.zeros(frames.shape[0], dtype=bool)
+        self.read_mask()
+        self.pending = False
+
+    def read_mask(self):
+        try:
+            mask = np.load(self.mask_path)
+        except (OSError, ValueError):
+            return
+        if mask.shape == self.decoded.shape:
+            self.decoded |= mask
+
+    def __contains__(self, index):
+        return bool(self.decoded[index])
+
+    def get(self, index):
+        """Return a read-only view of a cached frame"""
+        frame = self.frames[index]
+        frame.flags.writeable = False
+        return frame
+
+    def put(self, index, frame):
+        self.frames[index] = frame
+        self.decoded[index] = True
+        self.pending = True
+
+    def flush(self):
+        """Write decoded frames to disk, then merge and save the mask of decoded frames"""
+        if not self.pending:
+            return
+        self.frames.flush()
+        self.read_mask()  # keep frames decoded meanwhile by other processes
+        tmp_path = self.mask_path.with_name(f'{self.mask_path.stem}.{os.getpid()}.tmp.npy')
+        np.save(tmp_path, self.decoded)
+        os.replace(tmp_path, self.mask_path)
+        self.pending = False
+
+
+def open_frames(file_id, shape, dtype, max_bytes=None):
+    """Open cached frames of a DICOM file, creating a new cache entry on first use
+    Args:
+        file_id (str): identifier of the DICOM file (data_utils.file_identity)
+        shape (tuple): shape of the array of all frames
+        dtype: data type of the frames
+        max_bytes (int): size cap of the cache. Least recently used entries are deleted above this size
+    Returns: CachedFrames instance, or None if the cache cannot be used
+    """
+    dir_path = cache_dir()
+    dir_path.mkdir(parents=True, exist_ok=True)
+    array_path = dir_path / f'{file_id}.npy'
+    try:
+        fd = os.open(array_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            frames = np.load(array_path, mmap_mode='r+')
+        except (OSError, ValueError):  # entry being created by another process
+            if array_path.stat().st_size == 0 and time.time() - array_path.stat().st_mtime > 60:
+                array_path.unlink()  # creation was interrupted, entry will be created again next time
+            return None
+        if frames.shape != tuple(shape) or frames.dtype != dtype:
+            return None
+        os.utime(array_path)  # mark as recently used
+        return CachedFrames(array_path, frames)
+    os.close(fd)
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    evict((max_bytes if max_bytes is not None else get_max_bytes()) - size, keep=array_path)
+    frames = np.lib.format.open_memmap(array_path, mode='w+', dtype=dtype, shape=tuple(shape))
+    return CachedFrames(array_path, frames)
+
+
+def entries():
+    """List cached frame arrays with their size and time of last use"""
+    items = []
+    for path in cache_dir().glob('*.npy'):
+        if path.name.endswith(('.decoded.npy', '.tmp.npy')):
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        items.append((stat.st_mtime, stat.st_size, path))
+    return sorted(items)
+
+
+def evict(max_bytes, keep=None):
+    """Delete least recently used entries until the cache holds at most max_bytes
+    Args:
+        max_bytes (int): size to reach
+        keep: path of an entry that should not be deleted
+    Returns: None
+    """
+    items = [item for item in entries() if item[2] != keep]
+    total = sum(size for _, size, _ in items)
+    for _, size, path in items:
+        if total <= max_bytes:
+            break
+        for file_path in (path, path.with_suffix('.decoded.npy')):
+            try:
+                file_path.unlink()
+            except OSError:  # already deleted, or still mapped on Windows
+                pass
+        total -= size
+
+
+def clear():
+    """Delete all cached frames"""
+    evict(0)
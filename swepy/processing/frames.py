@@ -0,0 +1,168 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from swepy.processing import settings
+
+try:
+    from pydicom.pixels import get_decoder
+except ImportError:  # pydicom < 3: frames cannot be decoded individually
+    get_decoder = None
+
+DEFAULT_PROXY_FACTOR = 2  # downsampling factor of preview frames
+
+
+class FrameDecoder:
+    """Decode single frames of a DICOM dataset, keeping the most recently decoded frames in memory.
+
+    If a frame store (frame_cache.CachedFrames) is given, frames are read from it when available and
+    written to it once decoded.
+    """
+
+    def __init__(self, ds, cache_size=64, store=None):
+        self.ds = ds
+        self.store = store
+        self.n_frames = int(ds.get('NumberOfFrames', 1))
+        samples = int(ds.SamplesPerPixel)
+        self.frame_shape = (int(ds.Rows), int(ds.Columns)) + ((samples,) if samples > 1 else ())
+        sign = 'i' if ds.get('PixelRepresentation', 0) else 'u'
+        self.dtype = np.dtype(f'{sign}{max(int(ds.BitsAllocated) // 8, 1)}')
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.n_decoded = 0  # number of decoding operations, for profiling
+        self._decoder = get_decoder(ds.file_meta.TransferSyntaxUID) if get_decoder else None
+        self._lock = threading.Lock()  # frames are read by the GUI, its prefetch thread and analysis threads
+
+    def decode(self, index):
+        """Return a decoded frame
+        Args:
+            index (int): index of the frame in the DICOM file
+        Returns: frame array of shape (rows, columns, samples)
+        """
+        with self._lock:
+            if index in self.cache:
+                self.cache.move_to_end(index)
+                return self.cache[index]
+            if self.store is not None and index in self.store:
+                return self.store.get(index)
+        # decoded outside the lock, so that threads decode frames concurrently (a frame may be decoded twice)
+        if self._decoder is not None:
+            frame, _ = self._decoder.as_array(self.ds, index=index)
+        else:
+            frame = self.ds.pixel_array[index]
+        with self._lock:
+            self.n_decoded += 1
+            if self.store is not None:
+                self.store.put(index, frame)
+            self.cache[index] = frame
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return frame
+
+
+class LazyFrames:
+    """Array-like sequence of frames from a DICOM file, decoded only when accessed.
+
+    Indexing on the first (frame) dimension selects frames to decode. Indices on the other dimensions are
+    applied to each frame before stacking, so only the requested pixels are held for multiple frames.
+    """
+
+    def __init__(self, decoder, indices=None):
+        self.decoder = decoder
+        self.indices = np.arange(decoder.n_frames) if indices is None else np.asarray(indices, dtype=int)
+
+    @classmethod
+    def from_dataset(cls, ds, cache_size=64, store=None):
+        return cls(FrameDecoder(ds, cache_size, store))
+
+    @property
+    def shape(self):
+        return (len(self.indices),) + self.decoder.frame_shape
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def dtype(self):
+        return self.decoder.dtype
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __iter__(self):
+        for index in self.indices:
+            yield self.decoder.decode(index)
+        self.flush()
+
+    def flush(self):
+        """Save newly decoded frames to the frame store, if any"""
+        if self.decoder.store is not None:
+            self.decoder.store.flush()
+
+    def subset(self, indices):
+        """Return lazy frames for a selection of frames, sharing decoded frames with the current instance"""
+        return LazyFrames(self.decoder, self.indices[indices])
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        frame_key, pixel_key = key[0], key[1:]
+        if isinstance(frame_key, (int, np.integer)):
+            frame = self.decoder.decode(self.indices[frame_key])
+            return frame[pixel_key] if pixel_key else frame
+        frames = [self.decoder.decode(index) for index in self.indices[frame_key]]
+        self.flush()
+        if not frames:
+            return np.empty((0,) + self.decoder.frame_shape, dtype=self.dtype)[(slice(None),) + pixel_key]
+        if pixel_key:
+            frames = [frame[pixel_key] for frame in frames]
+        return np.stack(frames)
+
+    def __array__(self, dtype=None, copy=None):
+        arr = self[:]
+        return arr if dtype is None else arr.astype(dtype)
+
+
+def get_proxy_factor():
+    """Downsampling factor of preview frames, from settings if any"""
+    factor = settings.get_settings('PROXY_FACTOR')
+    return int(factor[0]) if factor else DEFAULT_PROXY_FACTOR
+
+
+class ProxyFrames:
+    """Downsampled copies of RGB frames (e.g. LazyFrames), to browse large files with a fraction of their memory.
+
+    Each frame is reduced (averaged over blocks of factor x factor pixels) when accessed, and only the most recently
+    used proxies are kept. Pixel (x, y) of a proxy frame covers pixels x * factor to (x + 1) * factor - 1 and
+    y * factor to (y + 1) * factor - 1 of source frames.
+    """
+
+    def __init__(self, frames, factor=None, cache_size=64):
+        self.frames = frames
+        self.factor = factor or get_proxy_factor()
+        rows, cols = frames.shape[1:3]
+        self.shape = (len(frames), -(-rows // self.factor), -(-cols // self.factor)) + tuple(frames.shape[3:])
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self._lock = threading.Lock()  # proxies are read by the GUI and its prefetch thread
+
+    def __len__(self):
+        return self.shape[0]
+
+    def reduce(self, index):
+        frame = Image.fromarray(np.asarray(self.frames[index], dtype=np.uint8))
+        return np.asarray(frame.reduce(self.factor))
+
+    def __getitem__(self, index):
+        with self._lock:
+            if index in self.cache:
+                self.cache.move_to_end(index)
+                return self.cache[index]
+        proxy = self.reduce(index)
+        with self._lock:
+            self.cache[index] = proxy
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return proxy
@@ -0,0 +1,46 @@
+from swepy.processing import settings
+
+DEFAULT_MAX_BYTES = 2 ** 30  # 1 GB
+CACHE_SHARE = 0.25  # share of the budget available to decoded frames kept in memory (frames.FrameDecoder)
+MAX_CACHED_FRAMES = 64
+
+# peak bytes per pixel while mapping colours: RGB values, void mask (int16 channels and differences),
+# packed RGB codes and lookup, encoded indices
+LUT_BYTES_PER_PIXEL = 3 + 3 * 2 + 3 * 2 + 2 + 1 + 2 * 4 + 2 + 1 + 8 + 2
+# brute force: int64 differences and float64 distances to every colour profile entry
+BRUTE_FORCE_BYTES_PER_VALUE = 3 * 8 * 2 + 8 * 2
+
+
+def get_max_bytes():
+    """Memory budget of an analysis, from settings if any"""
+    max_bytes = settings.get_settings('ANALYSIS_MAX_BYTES')
+    return int(max_bytes[0]) if max_bytes else DEFAULT_MAX_BYTES
+
+
+def bytes_per_pixel(mapping, n_values):
+    """Estimate of the peak memory used to map the colour of a pixel
+    Args:
+        mapping (str): method used to map RGB values to the colour profile, 'lut' or 'brute_force'
+        n_values (int): number of colour profile values
+    Returns: number of bytes
+    """
+    if mapping == 'brute_force':
+        return LUT_BYTES_PER_PIXEL + n_values * BRUTE_FORCE_BYTES_PER_VALUE
+    return LUT_BYTES_PER_PIXEL
+
+
+def frames_per_batch(n_pixels, pixel_bytes, max_bytes):
+    """Number of frames processed at once within a memory budget (at least one)
+    Args:
+        n_pixels (int): number of pixels of each frame
+        pixel_bytes (int): peak memory used per pixel (see bytes_per_pixel)
+        max_bytes (int): memory available
+    Returns: number of frames
+    """
+    return max(int(max_bytes // max(n_pixels * pixel_bytes, 1)), 1)
+
+
+def cached_frames(frame_bytes, max_bytes=None):
+    """Number of decoded frames kept in memory within a share of the memory budget (at least one)"""
+    max_bytes = max_bytes or get_max_bytes()
+    return int(min(max(max_bytes * CACHE_SHARE // max(frame_bytes, 1), 1), MAX_CACHED_FRAMES))
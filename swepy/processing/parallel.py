@@ -0,0 +1,41 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from swepy.processing import settings
+
+
+def get_workers():
+    """Number of threads mapping colours, from settings if any. Number of CPUs by default"""
+    workers = settings.get_settings('MAPPING_WORKERS')
+    return int(workers[0]) if workers else os.cpu_count() or 1
+
+
+def split_bounds(n, n_chunks):
+    """Start and stop indices of n_chunks chunks of nearly equal size"""
+    bounds = np.linspace(0, n, n_chunks + 1).astype(int)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def map_chunks(func, arr, workers=None):
+    """Apply an element-wise function to chunks of an array in a thread pool, and join the results.
+
+    Most NumPy operations release the GIL, so that chunks are processed on several cores. The array is split
+    along frames (1st axis), or along the 2nd axis if there are fewer frames than workers. Results are identical
+    to func(arr), as long as func processes each pixel independently.
+    Args:
+        func: function of an array returning an array of the same 1st and 2nd dimensions
+        arr: array of frames, e.g. (frames, rows, columns, 3) or (frames, pixels, 3)
+        workers (int): number of threads. See get_workers if None
+    Returns: array
+    """
+    workers = workers or get_workers()
+    axis = 0 if arr.shape[0] >= workers or arr.ndim < 3 else 1
+    n_chunks = min(workers, arr.shape[axis])
+    if n_chunks <= 1:
+        return func(arr)
+    chunks = [arr[start:stop] if axis == 0 else arr[:, start:stop]
+              for start, stop in split_bounds(arr.shape[axis], n_chunks)]
+    with ThreadPoolExecutor(max_workers=n_chunks) as executor:
+        return np.concatenate(list(executor.map(func, chunks)), axis=axis)
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import numpy as np
+
+from swepy.processing import data_utils
+
+SWE_VARS = ('velocity', 'shear_m', 'youngs_m')
+
+
+def encode_indices(indices, valid_mask, n_values):
+    """Store colour profile indices in the smallest integer type, with void pixels set to n_values"""
+    dtype = np.min_scalar_type(n_values)
+    return np.where(valid_mask, indices, n_values).astype(dtype)
+
+
+class RawValues(Mapping):
+    """Pixel values of each SWE variable, computed on demand from colour profile indices.
+
+    Only the indices (one small integer per pixel) and the colour profile values of the measured variable
+    are stored. Values of other variables are converted from the colour profile values (one per colour),
+    then gathered with the indices. The most recently used arrays are kept in a small cache.
+    """
+
+    def __init__(self, indices, real_values, swe_var, cache_size=2):
+        self.indices = indices
+        self.real_values = np.asarray(real_values)
+        self.swe_var = swe_var
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def scale_values(self, swe_var):
+        """Return the colour profile values converted to a SWE variable"""
+        if swe_var == self.swe_var:
+            return self.real_values
+        return data_utils.convert_swe(self.real_values, self.swe_var, swe_var)
+
+    def __getitem__(self, swe_var):
+        if swe_var not in SWE_VARS:
+            raise KeyError(swe_var)
+        if swe_var in self._cache:
+            self._cache.move_to_end(swe_var)
+            return self._cache[swe_var]
+        table = np.append(self.scale_values(swe_var), np.nan)  # void pixels are indexed past the colour profile
+        arr = table[self.indices]
+        self._cache[swe_var] = arr
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return arr
+
+    def __iter__(self):
+        return iter(SWE_VARS)
+
+    def __len__(self):
+        return len(SWE_VARS)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_cache'] = OrderedDict()  # derived arrays are not pickled
+        return state
+
+
+def export_stem(file_stem, roi_name=None):
+    """Name of files exported from results, with the name of the ROI if it was named"""
+    return f'{file_stem}_{roi_name}' if roi_name else file_stem
+
+
+class SweResults(Mapping):
+    """Analysis results of a file, readable as the former results dictionary
+    ('file', 'roi_coords', 'roi_shape', 'raw' and 'stats' keys, and 'roi_name' for named ROIs)"""
+
+    def __init__(self, file, roi_coords, roi_shape, stats, raw, roi_name=None):
+        self._items = {'file': file,
+                       'roi_name': roi_name,
+                       'roi_coords': roi_coords,
+                       'roi_shape': roi_shape,
+                       'raw': raw,
+                       'stats': stats}
+
+    def __getitem__(self, key):
+        return self._items[key]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from swepy.processing import data_utils, settings
+from swepy.processing.results import RawValues, SweResults
+
+CHUNK_FRAMES = 16  # frames per compressed chunk of raw data
+DEFAULT_MAX_BYTES = 5 * 2 ** 30  # 5 GB
+KEY_VERSION = 1  # change when analysis changes, so that results of previous versions are not reused
+
+
+def store_dir():
+    """Directory of stored analysis results"""
+    return data_utils.cache_dir() / 'results'
+
+
+def get_max_bytes():
+    """Size cap of the results store, from settings if any"""
+    max_bytes = settings.get_settings('RESULTS_CACHE_MAX_BYTES')
+    return int(max_bytes[0]) if max_bytes else DEFAULT_MAX_BYTES
+
+
+def analysis_key(file_id, params):
+    """Key of analysis results, from the identity of the analysed file and a canonical form of all parameters
+    Args:
+        file_id (str): identifier of the DICOM file (data_utils.file_identity)
+        params (dict): analysis parameters (JSON serialisable)
+    Returns: hexadecimal digest
+    """
+    canonical = json.dumps({'version': KEY_VERSION, 'file_id': file_id, 'params': params},
+                           sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def entry_paths(key, root=None):
+    """Paths of the metadata, stats table and raw data files of a stored result"""
+    dir_path = Path(root) if root else store_dir()
+    return {'meta': dir_path / f'{key}.json',
+            'stats': dir_path / f'{key}.stats.parquet',
+            'raw': dir_path / f'{key}.raw.npz'}
+
+
+def _replace(tmp_path, path):
+    os.replace(tmp_path, path)  # atomic, readers never see partially written files
+
+
+def save_results(results, key, summary=None, indices_key=None, root=None):
+    """Save analysis results: stats as a Parquet table, raw data as compressed chunks of colour profile indices
+    Args:
+        results (SweResults): analysis results
+        key (str): identifier of the analysed file and parameters (see analysis_key)
+        summary (dict): summary values of the analysis (e.g. mean and median of all frames)
+        indices_key (str): key shared by results with the same colour profile indices (see find_indices)
+        root: directory of the store. Default: store_dir()
+    Returns: key
+    """
+    paths = entry_paths(key, root)
+    paths['meta'].parent.mkdir(parents=True, exist_ok=True)
+    tmp = f'.{os.getpid()}.tmp'
+
+    raw = results['raw']
+    chunks = {f'indices_{start:06d}': raw.indices[start:start + CHUNK_FRAMES]
+              for start in range(0, raw.indices.shape[0], CHUNK_FRAMES)}
+    tmp_raw = paths['raw'].with_name(paths['raw'].name + tmp + '.npz')
+    np.savez_compressed(tmp_raw, real_values=raw.real_values, **chunks)
+    _replace(tmp_raw, paths['raw'])
+
+    tmp_stats = paths['stats'].with_name(paths['stats'].name + tmp)
+    pd.DataFrame.from_dict(results['stats']).to_parquet(tmp_stats)
+    _replace(tmp_stats, paths['stats'])
+
+    stem, parent = results['file']
+    meta = {'file': [stem, str(parent)],
+            'roi_name': results['roi_name'],
+            'roi_coords': [list(coord) for coord in results['roi_coords']],
+            'roi_shape': results['roi_shape'],
+            'swe_var': raw.swe_var,
+            'summary': summary or {}}
+    tmp_meta = paths['meta'].with_name(paths['meta'].name + tmp)
+    with open(tmp_meta, 'w') as file:
+        json.dump(meta, file)
+    _replace(tmp_meta, paths['meta'])  # written last: an entry exists once its metadata exists
+    if indices_key:
+        alias_path = indices_path(indices_key, root)
+        tmp_alias = alias_path.with_name(alias_path.name + tmp)
+        tmp_alias.write_text(key)
+        _replace(tmp_alias, alias_path)
+    return key
+
+
+def indices_path(indices_key, root=None):
+    """Path of the file holding the key of the latest results saved with the given colour profile indices"""
+    return (Path(root) if root else store_dir()) / f'{indices_key}.indices'
+
+
+def find_indices(indices_key, root=None):
+    """Return the key of stored results with the same colour profile indices (e.g. analysed with another
+    max. scale), None if there are none"""
+    try:
+        key = indices_path(indices_key, root).read_text().strip()
+    except FileNotFoundError:
+        return None
+    return key if contains(key, root) else None
+
+
+def load_meta(key, root=None):
+    """Load file name, ROI and SWE variable of stored results, without reading stats or raw data"""
+    with open(entry_paths(key, root)['meta'], 'r') as file:
+        meta = json.load(file)
+    meta['roi_coords'] = [tuple(coord) for coord in meta['roi_coords']]
+    return meta
+
+
+def load_stats(key, root=None):
+    """Load the table of stats per SWE frame of stored results, without reading raw data"""
+    return pd.read_parquet(entry_paths(key, root)['stats'])
+
+
+def load_stats_table(keys, root=None):
+    """Concatenate stats tables of several stored results, with file name and path columns"""
+    tables = []
+    for key in keys:
+        meta = load_meta(key, root)
+        df = load_stats(key, root)
+        df.insert(0, 'roi', meta.get('roi_name'))
+        df.insert(0, 'path', meta['file'][1])
+        df.insert(0, 'file', meta['file'][0])
+        tables.append(df.rename_axis('frame').reset_index())
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+
+
+def load_raw(key, root=None):
+    """Load raw data of stored results, as colour profile indices and colour profile values"""
+    with np.load(entry_paths(key, root)['raw']) as npz:
+        chunk_names = sorted(name for name in npz.files if name.startswith('indices_'))
+        indices = np.concatenate([npz[name] for name in chunk_names])
+        real_values = npz['real_values']
+    return indices, real_values
+
+
+def load_results(key, root=None):
+    """Load complete results (metadata, stats and raw data) of a stored analysis"""
+    meta = load_meta(key, root)
+    touch(key, root)
+    df = load_stats(key, root)
+    indices, real_values = load_raw(key, root)
+    stem, parent = meta['file']
+    return SweResults(file=[stem, Path(parent)],
+                      roi_coords=meta['roi_coords'],
+                      roi_shape=meta['roi_shape'],
+                      stats={column: df[column].to_numpy() for column in df.columns},
+                      raw=RawValues(indices, real_values, meta['swe_var']),
+                      roi_name=meta.get('roi_name'))
+
+
+def contains(key, root=None):
+    """Check whether results are stored under a key"""
+    return entry_paths(key, root)['meta'].exists()
+
+
+def touch(key, root=None):
+    """Mark stored results as recently used"""
+    try:
+        os.utime(entry_paths(key, root)['meta'])
+    except FileNotFoundError:
+        pass
+
+
+def list_keys(root=None):
+    """List keys of stored results"""
+    dir_path = Path(root) if root else store_dir()
+    return sorted(path.stem for path in dir_path.glob('*.json'))
+
+
+def entries(root=None):
+    """List keys of stored results with their size and time of last use"""
+    items = []
+    for key in list_keys(root):
+        paths = entry_paths(key, root)
+        try:
+            mtime = paths['meta'].stat().st_mtime
+            size = sum(path.stat().st_size for path in paths.values())
+        except FileNotFoundError:
+            continue
+        items.append((mtime, size, key))
+    return sorted(items)
+
+
+def delete(key, root=None):
+    for path in entry_paths(key, root).values():
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def evict(max_bytes=None, keep=None, root=None):
+    """Delete least recently used results until the store holds at most max_bytes
+    Args:
+        max_bytes (int): size to reach. Default: get_max_bytes()
+        keep (str): key of results that should not be deleted
+        root: directory of the store. Default: store_dir()
+    Returns: list of deleted keys
+    """
+    max_bytes = max_bytes if max_bytes is not None else get_max_bytes()
+    items = [item for item in entries(root) if item[2] != keep]
+    total = sum(size for _, size, _ in items)
+    if keep and contains(keep, root):
+        total += sum(path.stat().st_size for path in entry_paths(keep, root).values() if path.exists())
+    deleted = []
+    for _, size, key in items:
+        if total <= max_bytes:
+            break
+        delete(key, root)
+        deleted.append(key)
+        total -= size
+    if deleted:
+        prune_indices(root)
+    return deleted
+
+
+def prune_indices(root=None):
+    """Delete files of colour profile indices keys (see indices_path) whose results are no longer stored"""
+    for path in (Path(root) if root else store_dir()).glob('*.indices'):
+        try:
+            if not contains(path.read_text().strip(), root):
+                path.unlink()
+        except FileNotFoundError:  # deleted meanwhile by another process
+            pass
+
+
+def clear(root=None):
+    """Delete all stored results"""
+    for key in list_keys(root):
+        delete(key, root)
+    for path in (Path(root) if root else store_dir()).glob('*.indices'):
+        path.unlink()
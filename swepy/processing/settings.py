@@ -0,0 +1,181 @@
+import atexit
+import copy
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from swepy.processing import data_utils
+
+WRITE_DELAY = 1.0  # s without changes before settings are written
+LOCK_TIMEOUT = 10.0  # s after which a lock left by a crashed process is removed
+
+
+def settings_path():
+    """Path of the JSON file of settings"""
+    return data_utils.cache_dir() / 'settings.json'
+
+
+class Settings:
+    """Settings of previous analyses, loaded once and kept in memory.
+
+    Changes are written after WRITE_DELAY seconds without further changes (or at exit), merged with the file
+    content written in the meantime by other instances, to a temporary file renamed over the settings file.
+    """
+
+    def __init__(self, path=None, delay=WRITE_DELAY):
+        self.path = path or settings_path()
+        self.delay = delay
+        self._values = None
+        self._changed = {}  # param: new value, None if deleted
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @property
+    def values(self):
+        with self._lock:
+            if self._values is None:
+                self._values = self._read()
+            return self._values
+
+    def get(self, param, default=None):
+        """Return a copy of the value of a parameter, or default ([] if None) if it was never set"""
+        value = self.values.get(param)
+        if value is None:
+            return [] if default is None else default
+        return copy.deepcopy(value)
+
+    def set(self, param, value):
+        """Change the value of a parameter and schedule its writing"""
+        with self._lock:
+            if self.values.get(param) == value:
+                return
+            self.values[param] = value
+            self._changed[param] = value
+            self._schedule()
+
+    def delete(self, param):
+        with self._lock:
+            self.values.pop(param, None)
+            self._changed[param] = None
+            self._schedule()
+
+    def _schedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        """Write pending changes, keeping parameters changed by other instances"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._changed:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._file_lock():
+                values = self._read()
+                for param, value in self._changed.items():
+                    if value is None:
+                        values.pop(param, None)
+                    else:
+                        values[param] = value
+                tmp_path = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+                with open(tmp_path, 'w') as file:
+                    json.dump(values, file)
+                os.replace(tmp_path, self.path)  # atomic, readers never see a partially written file
+            self._values = values
+            self._changed.clear()
+
+    @contextmanager
+    def _file_lock(self):
+        """Lock the settings file against concurrent writes of other processes"""
+        lock_path = self.path.with_name(self.path.name + '.lock')
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > LOCK_TIMEOUT:
+                        os.remove(lock_path)
+                except OSError:
+                    pass
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            os.close(fd)
+            os.remove(lock_path)
+
+
+_settings = None
+
+
+def shared():
+    """Return the settings object shared by the application"""
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+        atexit.register(_settings.flush)
+    return _settings
+
+
+def get_settings(param):
+    """Load a parameter settings from previous analyses"""
+    return shared().get(param)
+
+
+def delete_settings(param=None):
+    """Delete a parameter settings or all settings from previous analyses
+    Args:
+        param: parameter for which settings should be deleted
+    Returns: None
+    """
+    params = [param] if param else list(shared().values)
+    for parameter in params:
+        shared().set(parameter, [])
+
+
+def save_path(path):
+    """Add file path to a list of recent file paths"""
+    paths = get_settings('RECENT_PATHS')
+    if path in paths:
+        return
+    shared().set('RECENT_PATHS', [path] + paths[:9])
+
+
+def save_usr_input(fhz, scale):
+    """Save SWE frequency and max. scale from colour bar"""
+    shared().set('SWE_PARAM', [fhz, scale])
+
+
+def save_roi_coords(roi_coords):
+    """Save roi coordinates from 1st analysed file"""
+    shared().set('ROI_COORDS', [roi_coords])
+
+
+def save_swe_var(swe_var):
+    """Save SWE variable chosen by user"""
+    shared().set('SWE_VAR', [swe_var])
+
+
+def save_cmap_source(cmap_loc):
+    """Save cmap preference"""
+    shared().set('CMAP_LOC', [cmap_loc])
+
+
+def save_sat_thresh(sat_thresh):
+    """Save chosen saturation level"""
+    shared().set('SAT_THRESH', [sat_thresh])
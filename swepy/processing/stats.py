@@ -0,0 +1,52 @@
+import numpy as np
+
+
+def index_histograms(indices, valid_mask, n_bins):
+    """Count colour profile indices of valid (non-void) pixels in each frame
+    Args:
+        indices: (n frames, n pixels) array of colour profile indices
+        valid_mask: (n frames, n pixels) boolean array, False for void pixels
+        n_bins (int): number of colour profile entries
+    Returns: (n frames, n_bins) array of pixel counts
+    """
+    counts = np.zeros((indices.shape[0], n_bins), dtype=np.int64)
+    for i, (frame_indices, frame_mask) in enumerate(zip(indices, valid_mask)):
+        counts[i] = np.bincount(frame_indices[frame_mask], minlength=n_bins)
+    return counts
+
+
+def histogram_stats(counts, values):
+    """Calculate median, mean and standard deviation from histograms of values
+    Args:
+        counts: (..., n bins) array of pixel counts
+        values: (n bins) array of values matching each bin (e.g. velocity or modulus)
+    Returns: median, mean and SD arrays of shape counts.shape[:-1]. NaN where counts are all zero
+    """
+    order = np.argsort(values, kind='stable')
+    values = np.asarray(values, dtype=np.float64)[order]
+    counts = counts[..., order]
+    n = counts.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (counts * values).sum(axis=-1) / n
+        sd = np.sqrt((counts * (values - mean[..., np.newaxis]) ** 2).sum(axis=-1) / n)
+    # median: average of values at ranks (n - 1) // 2 and n // 2, as numpy does for even counts
+    cumulated = counts.cumsum(axis=-1)
+    lower = values[np.argmax(cumulated > ((n - 1) // 2)[..., np.newaxis], axis=-1)]
+    upper = values[np.argmax(cumulated > (n // 2)[..., np.newaxis], axis=-1)]
+    median = np.where(n > 0, (lower + upper) / 2, np.nan)
+    return median, mean, sd
+
+
+def pixel_percent(count, n_pixels):
+    """Express a number of pixels as a percentage of all pixels of a region"""
+    return (count / np.full(np.shape(count), n_pixels)) * 100
+
+
+def saturated_percent(counts, values, threshold, n_pixels):
+    """Percentage of pixels of each frame with values above a threshold"""
+    return pixel_percent(counts[..., np.asarray(values) > threshold].sum(axis=-1), n_pixels)
+
+
+def void_percent(counts, n_pixels):
+    """Percentage of void pixels (not counted in histograms) of each frame"""
+    return pixel_percent(n_pixels - counts.sum(axis=-1), n_pixels)
@@ -0,0 +1,92 @@
+import numpy as np
+
+LOW_CONFIDENCE = 0.5  # confidence of estimated SWE frequencies below which files should be checked
+
+
+def colour_mask(rgb, void_threshold=150):
+    """Mask of coloured (SWE) pixels, as opposed to grey B-mode pixels (see DcmData.void_filter)"""
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    return np.abs(r - g) + np.abs(r - b) + np.abs(g - b) > void_threshold
+
+
+def change_scores(frames, box, void_threshold=150, pixel_tolerance=30):
+    """Measure changes of SWE content between consecutive frames, in one pass over frames.
+
+    Only the SWE box of the current and previous frames is kept. Grey (void) pixels show B-mode images, which are
+    updated at every frame, so only coloured pixels are compared. Small colour differences, e.g. from lossy
+    compression, are ignored.
+    Args:
+        frames: iterable of (rows, columns, 3) RGB frames, e.g. LazyFrames decoding one frame at a time
+        box (tuple): x0, y0, x1, y1 image coordinates of the SWE box (inclusive)
+        void_threshold (int): cumulative difference between channels above which pixels are coloured
+        pixel_tolerance (int): cumulative difference between channels of 2 frames above which a pixel changed
+    Yields: fraction of changed coloured pixels, for each frame but the first one
+    """
+    x0, y0, x1, y1 = box
+    previous = None
+    for frame in frames:
+        rgb = frame[y0:y1 + 1, x0:x1 + 1].astype(np.int16)  # copy of the SWE box only
+        coloured = colour_mask(rgb, void_threshold)
+        if previous is not None:
+            previous_rgb, previous_coloured = previous
+            compared = coloured | previous_coloured
+            changed = (coloured != previous_coloured) | (np.abs(rgb - previous_rgb).sum(axis=-1) > pixel_tolerance)
+            n_compared = np.count_nonzero(compared)
+            yield np.count_nonzero(changed & compared) / n_compared if n_compared else 0.0
+        previous = rgb, coloured
+
+
+def swe_changes(scores, min_fraction=0.05):
+    """Find frames following a change of SWE content from change scores (see change_scores).
+    Scores of repeated and updated SWE images are separated at the largest gap between sorted scores,
+    unless scores are too close to form 2 groups.
+    Args:
+        scores: fraction of changed coloured pixels for each frame but the first one
+        min_fraction (float): minimal fraction of changed coloured pixels of updated SWE images
+    Returns: indices of frames following a change of SWE content
+    """
+    scores = np.asarray(list(scores), dtype=float)
+    threshold = min_fraction
+    if len(scores) > 1:
+        sorted_scores = np.sort(scores)
+        gaps = np.diff(sorted_scores)
+        i = np.argmax(gaps)
+        if gaps[i] > min_fraction:
+            threshold = max(threshold, (sorted_scores[i] + sorted_scores[i + 1]) / 2)
+    return np.flatnonzero(scores > threshold) + 1
+
+
+def estimate_swe_rate(scores, indices, bmode_fhz):
+    """Estimate the frequency of SWE updates from the periodicity of changes of SWE content.
+
+    The period (in frames) is the first lag close to the highest peak of the autocorrelation of change scores.
+    SWE updates do not always fall on the same B-mode frames (e.g. 1.5 Hz at 20 Hz: intervals of 13 or 14 frames),
+    so the autocorrelation is summed over neighbouring lags and the period is refined with the mean interval
+    between changes when it agrees. The height of the autocorrelation peak is used as confidence.
+    Args:
+        scores: fraction of changed coloured pixels for each frame but the first one (see change_scores)
+        indices: indices of frames following a change of SWE content (see swe_changes)
+        bmode_fhz (float): frame rate of the sequence (RecommendedDisplayFrameRate)
+    Returns: SWE frequency (Hz) and confidence (0 to 1). None and 0 if no periodic changes are found
+    """
+    scores = np.asarray(list(scores), dtype=float)
+    if len(indices) < 2:
+        return None, 0.0
+    if len(indices) == len(scores):  # changes at every frame, e.g. noisy colours: no period to find
+        return None, 0.0
+    centred = scores - scores.mean()
+    n = len(centred)
+    lags = np.arange(1, n // 2 + 1)
+    if not len(lags) or not centred.any():
+        return None, 0.0
+    autocorr = np.array([np.dot(centred[:-lag], centred[lag:]) / (n - lag) for lag in lags]) / centred.var()
+    summed = np.convolve(np.append(autocorr.clip(0), 0), np.ones(3), mode='same')[:-1]  # lags - 1, lag, lag + 1
+    i = np.argmax(summed >= 0.8 * summed.max())
+    period = lags[i]
+    confidence = float(np.clip(summed[i], 0, 1))
+    if not confidence:
+        return None, 0.0
+    mean_interval = (indices[-1] - indices[0]) / (len(indices) - 1)
+    if abs(mean_interval - period) <= 1:
+        period = mean_interval
+    return float(bmode_fhz / period), confidence
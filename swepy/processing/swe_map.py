@@ -0,0 +1,35 @@
+import numpy as np
+
+
+class SweMap:
+    """Colour profile indices of every pixel of the SWE box, for each resampled frame.
+
+    Void pixels are set to n_values (see results.encode_indices). ROIs within the box are analysed by indexing
+    the map, instead of mapping the colours of their pixels again.
+    """
+
+    def __init__(self, indices, origin, n_values, key=None):
+        self.indices = indices  # (n frames, box height, box width)
+        self.origin = origin  # (x, y) image coordinates of the upper left pixel of the box
+        self.n_values = n_values
+        self.key = key  # frames, colour profile and void threshold the map was built with
+
+    @property
+    def shape(self):
+        return self.indices.shape
+
+    def contains(self, xs, ys):
+        """Check whether all pixels at image coordinates xs, ys are in the box"""
+        x0, y0 = self.origin
+        _, height, width = self.indices.shape
+        return bool(len(xs)) and xs.min() >= x0 and ys.min() >= y0 and xs.max() < x0 + width and ys.max() < y0 + height
+
+    def roi_indices(self, xs, ys):
+        """Return the (n frames, n pixels) array of colour profile indices of pixels at image coordinates xs, ys"""
+        x0, y0 = self.origin
+        return self.indices[:, ys - y0, xs - x0]
+
+    def histogram(self, xs, ys):
+        """Count colour profile indices of valid pixels at image coordinates xs, ys, over all frames"""
+        counts = np.bincount(self.roi_indices(xs, ys).ravel(), minlength=self.n_values + 1)
+        return counts[:self.n_values]
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import scipy.io as sio
+from PIL import Image, ImageDraw, ImageFont
+
+from src.src_utils import get_project_root
+from swepy.processing import colour_bar
+
+BAR = (693, 70, 701, 180)  # x0, y0, x1, y1 (exclusive)
+SWE_BOX = (100, 50, 399, 199)  # x0, y0, x1, y1 (inclusive)
+
+
+@pytest.fixture(scope='module')
+def colour_map():
+    cmap = sio.loadmat(str(get_project_root() / 'src/colormap.mat'))['map']
+    return (cmap * 255).astype(np.uint8)[::-1]
+
+
+def make_frame(colour_map, label, font_size=13):
+    """Grey frame with a SWE box, a colour bar with a border and its scale labels"""
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 60, (600, 800, 1), dtype=np.uint8).repeat(3, axis=-1)
+    x0, y0, x1, y1 = SWE_BOX
+    frame[y0:y1 + 1, x0:x1 + 1] = colour_map[rng.integers(0, len(colour_map), (y1 - y0 + 1, x1 - x0 + 1))]
+    x0, y0, x1, y1 = BAR
+    frame[y0 - 1:y1 + 1, x0 - 1:x1 + 1] = 200  # border
+    frame[y0:y1, x0:x1] = colour_map[np.linspace(0, len(colour_map) - 1, y1 - y0).astype(int), None]
+    img = Image.fromarray(frame)
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(font_size)
+    if label is not None:
+        draw.text((x1 + 4, y0 - font_size // 2), f'{label} kPa', fill=(230, 230, 230), font=font)
+    draw.text((x1 + 4, y1 - 5), '0', fill=(230, 230, 230), font=font)
+    return np.asarray(img)
+
+
+def test_find_colour_bar(colour_map):
+    frame = make_frame(colour_map, '300')
+    assert colour_bar.find_colour_bar(frame, exclude=SWE_BOX) == BAR
+
+
+def test_no_colour_bar():
+    frame = np.full((600, 800, 3), 30, dtype=np.uint8)
+    assert colour_bar.find_colour_bar(frame) is None
+
+
+@pytest.mark.parametrize('label', ['300', '1200', '45', '7.5'])
+def test_read_label(colour_map, label):
+    frame = make_frame(colour_map, label)
+    value, score, rows = colour_bar.read_label(frame, BAR)
+    assert value == float(label)
+    assert score >= colour_bar.MIN_DIGIT_SCORE
+    assert rows[0] < BAR[1] < rows[1]
+
+
+def test_read_label_without_text(colour_map):
+    frame = make_frame(colour_map, None)
+    assert colour_bar.read_label(frame, BAR) == (None, 0.0, None)
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+import scipy.io as sio
+
+from src.src_utils import get_project_root
+from swepy.processing import colour_lut, data_utils
+
+
+@pytest.fixture
+def lut_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(colour_lut, 'lut_dir', lambda: tmp_path)
+    monkeypatch.setattr(colour_lut, '_LUTS', colour_lut.OrderedDict())
+    return tmp_path
+
+
+def colour_profile(seed):
+    return np.random.default_rng(seed).integers(0, 256, (32, 3))
+
+
+def test_lut_cache_evicts_least_recently_used_tables(lut_dir, monkeypatch):
+    table_bytes = 2 ** 24 + 128  # uint8 table and .npy header
+    monkeypatch.setattr(colour_lut, 'get_max_bytes', lambda: 2 * table_bytes)
+    paths = []
+    for seed in range(3):
+        lut = colour_lut.get_rgb_lut(colour_profile(seed))
+        lut.closest_rgb(np.array([[seed, 0, 0]], dtype=np.uint8))
+        colour_lut.save_rgb_lut(lut)
+        paths.append(lut_dir / f'{lut.key}.npy')
+        os.utime(paths[-1], (seed, seed))  # distinct times of last use
+    assert [path.exists() for path in paths] == [False, True, True]
+
+
+def test_lut_is_loaded_from_cache(lut_dir):
+    lut = colour_lut.get_rgb_lut(colour_profile(0))
+    rgb = np.array([[10, 20, 30]], dtype=np.uint8)
+    lut.closest_rgb(rgb)
+    colour_lut.save_rgb_lut(lut)
+    colour_lut._LUTS.clear()
+    loaded = colour_lut.get_rgb_lut(colour_profile(0))
+    assert loaded is not lut
+    assert loaded.table[colour_lut.pack_rgb(rgb)] == lut.table[colour_lut.pack_rgb(rgb)]
+
+
+@pytest.mark.parametrize('profile', ['colour_map', 'duplicates', 'random'])
+def test_lut_matches_closest_rgb(profile):
+    if profile == 'random':
+        profile_rgb = colour_profile(2)
+    else:
+        cmap = sio.loadmat(str(get_project_root() / 'src/colormap.mat'))['map']
+        profile_rgb = (cmap * 255).astype(int)
+        if profile == 'duplicates':  # equidistant entries, the first one is chosen
+            profile_rgb = np.repeat(profile_rgb[::8], 2, axis=0)
+    roi = np.random.default_rng(1).integers(0, 256, (60, 70, 3), dtype=np.uint8)
+    n_exact = min(len(profile_rgb), roi.shape[1])
+    roi[0, :n_exact] = profile_rgb[:n_exact]  # colours of the profile itself
+    lut = colour_lut.RgbLut(profile_rgb)
+    assert np.array_equal(lut.closest_rgb(roi), data_utils.closest_rgb(roi, profile_rgb))
+    assert np.array_equal(lut.closest_rgb(roi[0]), data_utils.closest_rgb(roi[0], profile_rgb))
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+import scipy.io as sio
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+from src.src_utils import get_project_root
+from swepy.processing import data_utils, results_store
+from swepy.processing.data import DcmData
+
+ROI = [(131, 80), (260, 170)]
+
+
+def region(x0, y0, x1, y1):
+    item = Dataset()
+    item.RegionLocationMinX0, item.RegionLocationMinY0 = x0, y0
+    item.RegionLocationMaxX1, item.RegionLocationMaxY1 = x1, y1
+    return item
+
+
+@pytest.fixture(scope='module')
+def dcm_path(tmp_path_factory):
+    """Multi-frame RGB file with a B-mode and a SWE field of view, a colour bar and SWE frames changing every
+    2 frames"""
+    rng = np.random.default_rng(0)
+    cmap = (sio.loadmat(str(get_project_root() / 'src/colormap.mat'))['map'] * 255).astype(np.uint8)[::-1]
+    frames = rng.integers(0, 60, (10, 600, 800, 1), dtype=np.uint8).repeat(3, axis=-1)
+    frames[:, 70:180, 693:701] = cmap[:, np.newaxis]
+    for i in range(0, len(frames), 2):
+        swe = cmap[rng.integers(0, len(cmap), (150, 300))]
+        void = rng.random((150, 300)) < 0.2
+        for frame in frames[i:i + 2]:
+            frame[50:200, 100:400][~void] = swe[~void]
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.SOPClassUID = ds.file_meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.3.1'
+    ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds.PatientName, ds.AcquisitionDateTime = 'Test^Patient', '20240101120000'
+    ds.Manufacturer, ds.ManufacturerModelName = 'SuperSonic Imagine', 'MACH30'
+    ds.NumberOfFrames, ds.Rows, ds.Columns = len(frames), 600, 800
+    ds.SamplesPerPixel, ds.PhotometricInterpretation, ds.PlanarConfiguration = 3, 'RGB', 0
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit, ds.PixelRepresentation = 8, 8, 7, 0
+    ds.LossyImageCompression = '00'
+    ds.RecommendedDisplayFrameRate = 20
+    ds.SequenceOfUltrasoundRegions = [region(50, 30, 450, 250), region(100, 50, 400, 200),
+                                      region(50, 255, 450, 475)]
+    ds.PixelData = frames.tobytes()
+    path = tmp_path_factory.mktemp('dcm') / 'swe.dcm'
+    ds.save_as(path, enforce_file_format=True)
+    return path
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_utils, 'cache_dir', lambda: tmp_path)
+    return tmp_path
+
+
+def analyse(path, max_scale, mapping='lut', workers=1, max_bytes=None, rois=None):
+    data = DcmData(path)
+    data.read_header()
+    data.swe_fhz = 10
+    data.max_scale = max_scale
+    data.analysis_swe_var = 'youngs_m'
+    data.workers = workers
+    data.max_bytes = max_bytes
+    keys = [key for _, key in data.analyse_rois(rois or {'roi': ROI}, 'local_cmap', mapping, sat_thresh=90)]
+    return data, keys[0]
+
+
+@pytest.mark.parametrize('max_scale', [300, 150])
+def test_rescaled_results_match_full_analysis(dcm_path, cache_dir, max_scale):
+    analyse(dcm_path, 120)
+    rescaled, key = analyse(dcm_path, max_scale)
+    assert rescaled.img_array is None  # calculated from stored indices, without decoding frames
+    stored_keys = results_store.list_keys()
+    assert key in stored_keys and len(stored_keys) == 2
+    results_store.clear()
+    full, _ = analyse(dcm_path, max_scale)
+    assert full.img_array is not None
+    for name, values in full.results['stats'].items():
+        assert np.array_equal(rescaled.results['stats'][name], values, equal_nan=True), name
+    assert np.array_equal(rescaled.results['raw'].indices, full.results['raw'].indices)
+    assert (rescaled.median, rescaled.mean, rescaled.mean_low_stdev) == (full.median, full.mean,
+                                                                        full.mean_low_stdev)
+
+
+@pytest.mark.parametrize('mapping', ['lut', 'brute_force'])
+@pytest.mark.parametrize('roi', [ROI, [(90, 40), (300, 230), (160, 240)]])  # in and outside the SWE box
+def test_parallel_mapping_is_identical(dcm_path, cache_dir, mapping, roi):
+    serial, _ = analyse(dcm_path, 300, mapping, rois={'roi': roi})
+    for workers, max_bytes in [(4, None), (3, 1)]:  # one frame per batch if the budget is exceeded
+        results_store.clear()
+        parallel, _ = analyse(dcm_path, 300, mapping, workers, max_bytes, rois={'roi': roi})
+        assert np.array_equal(parallel.indices, serial.indices)
+        assert parallel.indices.dtype == serial.indices.dtype
+        for name, values in serial.results['stats'].items():
+            assert np.array_equal(parallel.results['stats'][name], values, equal_nan=True), name
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from swepy.processing import data_utils
+
+
+def lowest_stdev_window(values, window):
+    """Start of the window with the lowest SD, found with successive np.std calls"""
+    min_std_dev, best_start_index = float('inf'), None
+    for i in range(len(values) - (window - 1)):
+        std_dev = np.std(values[i:i + window])
+        if std_dev < min_std_dev:
+            min_std_dev, best_start_index = std_dev, i
+    return best_start_index, min_std_dev
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('window', [1, 3, 5, 12])
+def test_rank_stdev_windows_matches_loop(seed, window):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(rng.uniform(0, 200), rng.uniform(0.1, 30), rng.integers(window, 60))
+    if seed % 2:  # repeated values, i.e. windows of equal SD
+        values = np.round(values / 10) * 10
+    order, stdevs = data_utils.rank_stdev_windows(values, window)
+    start, std_dev = lowest_stdev_window(values, window)
+    # windows of equal SD (e.g. the same values in another order) may differ by a rounding error of np.std,
+    # which decides the window of the loop: the first of them must be ranked first
+    window_stdevs = np.array([np.std(values[i:i + window]) for i in range(len(values) - window + 1)])
+    assert order[0] == np.flatnonzero(np.isclose(window_stdevs, std_dev, rtol=1e-12, atol=1e-12))[0]
+    assert order[0] == start or window_stdevs[order[0]] == pytest.approx(std_dev, rel=1e-12)
+    assert stdevs[0] == pytest.approx(std_dev, abs=1e-9)
+
+
+def test_rank_stdev_windows_of_rows():
+    rng = np.random.default_rng(0)
+    values = rng.normal(100, 20, (4, 30))
+    order, _ = data_utils.rank_stdev_windows(values, 5)
+    assert [row[0] for row in order] == [lowest_stdev_window(row, 5)[0] for row in values]
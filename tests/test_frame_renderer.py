@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from swepy.app.frame_renderer import FrameRenderer
+from swepy.app.view_frames import ImgPanel
+
+
+def test_close_stops_prefetch_thread():
+    renderer = FrameRenderer(canvas=None)
+    renderer.set_frames(np.zeros((4, 8, 8, 3), dtype=np.uint8))
+    renderer.requests.put((renderer.generation, [1, 2]))
+    renderer.close()
+    renderer.thread.join(timeout=10)
+    assert not renderer.thread.is_alive()
+    assert renderer.frames is None and not renderer.images
+
+
+def test_roi_coordinates_of_preview_frames():
+    panel = SimpleNamespace(display_factor=2)
+    assert ImgPanel.to_canvas(panel, [(10, 21), (41, 60)]) == [(5, 10), (20, 30)]
+    assert ImgPanel.to_canvas(panel, [9, 21, 11, 23]) == [4, 10, 5, 11]
+    assert ImgPanel.from_canvas(panel, SimpleNamespace(x=5, y=10)) == (10, 20)
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from swepy.processing.frames import ProxyFrames
+
+
+@pytest.fixture
+def frames():
+    return np.random.default_rng(0).integers(0, 256, (5, 11, 9, 3), dtype=np.uint8)
+
+
+def test_proxy_frames_average_blocks(frames):
+    proxies = ProxyFrames(frames, factor=2)
+    assert proxies.shape == (5, 6, 5, 3)
+    assert proxies[1].shape == (6, 5, 3)
+    assert np.abs(proxies[1][0, 0] - frames[1, :2, :2].reshape(-1, 3).mean(axis=0)).max() <= 1
+
+
+def test_proxy_frames_are_reduced_once_and_bounded(frames):
+    proxies = ProxyFrames(frames, factor=2, cache_size=2)
+    first = proxies[0]
+    assert proxies[0] is first
+    proxies[1], proxies[2]
+    assert list(proxies.cache) == [1, 2]
+    assert np.array_equal(proxies[0], first)
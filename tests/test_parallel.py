@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from swepy.processing import data_utils, parallel
+
+
+@pytest.mark.parametrize('shape', [(9, 40, 3), (2, 40, 3), (1, 5, 3), (3, 4, 6, 3)])
+@pytest.mark.parametrize('workers', [1, 2, 3, 8])
+def test_map_chunks_is_identical_to_func(shape, workers):
+    rng = np.random.default_rng(0)
+    colour_profile = rng.integers(0, 256, (20, 3))
+    rgb = rng.integers(0, 256, shape, dtype=np.uint8)
+
+    def func(chunk):
+        return data_utils.closest_rgb(chunk.reshape(len(chunk), -1, 3), colour_profile).reshape(chunk.shape[:-1])
+
+    expected = func(rgb)
+    result = parallel.map_chunks(func, rgb, workers)
+    assert result.dtype == expected.dtype
+    assert np.array_equal(result, expected)
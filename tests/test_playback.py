@@ -0,0 +1,45 @@
+from swepy.app.playback import DEFAULT_FHZ, PlaybackClock
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 100.0
+
+    def __call__(self):
+        return self.time
+
+
+def test_frames_follow_wall_clock():
+    clock = FakeClock()
+    playback = PlaybackClock(clock)
+    playback.start(3, 10)
+    assert playback.due_frame() == 3
+    assert playback.delay_ms() == 100
+    clock.time += 0.25
+    assert playback.due_frame() == 5
+    assert playback.delay_ms() == 50
+
+
+def test_late_frames_are_dropped_without_drift():
+    clock = FakeClock()
+    playback = PlaybackClock(clock)
+    playback.start(0, 20)
+    clock.time += 0.33  # slow rendering: frames 1 to 5 are skipped
+    assert playback.due_frame() == 6
+    assert abs(playback.delay_ms() - 20) <= 1  # next frame at 0.35 s, as if no frame was late
+    clock.time += 0.025
+    assert playback.due_frame() == 7
+
+
+def test_speed_multiplier():
+    clock = FakeClock()
+    playback = PlaybackClock(clock)
+    playback.start(0, 20 * 4)
+    clock.time += 1
+    assert playback.due_frame() == 80
+
+
+def test_unknown_frame_rate():
+    playback = PlaybackClock(FakeClock())
+    playback.start(0, None)
+    assert playback.fhz == DEFAULT_FHZ
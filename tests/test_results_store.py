@@ -0,0 +1,26 @@
+import os
+
+from swepy.processing import catalogue, results_store
+
+
+def store_entry(root, key, size, mtime, indices_key):
+    """Fake stored results of the given size, with an indices file pointing to them"""
+    for path in results_store.entry_paths(key, root).values():
+        path.write_bytes(b'0' * size)
+        os.utime(path, (mtime, mtime))
+    results_store.indices_path(indices_key, root).write_text(key)
+
+
+def test_evict_deletes_indices_of_evicted_results(tmp_path):
+    store_entry(tmp_path, 'old', 100, 1, 'a')
+    store_entry(tmp_path, 'new', 100, 2, 'b')
+    assert results_store.evict(400, root=tmp_path) == ['old']
+    assert not results_store.indices_path('a', tmp_path).exists()
+    assert results_store.find_indices('b', tmp_path) == 'new'
+
+
+def test_catalogue_is_created_once(tmp_path, monkeypatch):
+    path = tmp_path / 'catalogue.db'
+    catalogue.connect(path).close()
+    monkeypatch.setattr(catalogue, 'SCHEMA', 'invalid sql')  # would fail if run again
+    catalogue.connect(path).close()
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from swepy.processing import stats
+
+
+@pytest.mark.parametrize('n_pixels', [1, 2, 7, 50])
+def test_histogram_stats_match_pixel_stats(n_pixels):
+    rng = np.random.default_rng(n_pixels)
+    n_bins = 32
+    values = np.sort(rng.uniform(0, 300, n_bins))[::-1]  # decreasing, as values of a colour bar
+    indices = rng.integers(0, n_bins, (6, n_pixels))
+    valid_mask = rng.random((6, n_pixels)) > 0.3
+    valid_mask[0] = False  # frame without SWE data
+    pixel_values = np.where(valid_mask, values[indices], np.nan)
+    counts = stats.index_histograms(indices, valid_mask, n_bins)
+    median, mean, sd = stats.histogram_stats(counts, values)
+    with np.errstate(invalid='ignore'), pytest.warns(RuntimeWarning):
+        expected = (np.nanmedian(pixel_values, axis=1), np.nanmean(pixel_values, axis=1),
+                    np.nanstd(pixel_values, axis=1))
+    assert np.array_equal(median, expected[0], equal_nan=True)
+    np.testing.assert_allclose(mean, expected[1], rtol=1e-12)
+    np.testing.assert_allclose(sd, expected[2], rtol=1e-9, atol=1e-9)
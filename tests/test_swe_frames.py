@@ -0,0 +1,61 @@
+import numpy as np
+
+from swepy.processing import swe_frames
+
+BMODE_FHZ = 20
+
+
+def periodic_scores(n_frames=60, period=5, seed=0):
+    """Change scores of a sequence whose SWE content changes every period frames"""
+    rng = np.random.default_rng(seed)
+    scores = rng.uniform(0, 0.02, n_frames - 1)
+    scores[period - 1::period] = rng.uniform(0.8, 1, len(scores[period - 1::period]))
+    return scores
+
+
+def test_change_scores_ignore_bmode_pixels():
+    rng = np.random.default_rng(0)
+    colours = np.array([[255, 0, 0], [0, 0, 255]], dtype=np.uint8)
+    frames = []
+    for i in range(9):
+        frame = rng.integers(0, 100, (40, 40, 1), dtype=np.uint8).repeat(3, axis=-1)  # grey B-mode, new each frame
+        frame[10:20, 10:20] = colours[(i // 3) % 2]  # SWE content updated every 3 frames
+        frames.append(frame)
+    scores = list(swe_frames.change_scores(frames, (5, 5, 25, 25)))
+    assert np.allclose(scores, [0, 0, 1, 0, 0, 1, 0, 0])
+    assert list(swe_frames.swe_changes(scores)) == [3, 6]
+
+
+def test_swe_changes_of_periodic_scores():
+    indices = swe_frames.swe_changes(periodic_scores())
+    assert list(indices) == list(range(5, 60, 5))
+
+
+def test_estimate_periodic_rate():
+    scores = periodic_scores()
+    fhz, confidence = swe_frames.estimate_swe_rate(scores, swe_frames.swe_changes(scores), BMODE_FHZ)
+    assert fhz == BMODE_FHZ / 5
+    assert confidence >= swe_frames.LOW_CONFIDENCE
+
+
+def test_estimate_irregular_intervals():
+    # 1.5 Hz at 20 Hz: changes every 13 or 14 frames
+    changes = np.round(np.arange(1, 8) * BMODE_FHZ / 1.5).astype(int)
+    scores = np.full(changes[-1] + 5, 0.01)
+    scores[changes - 1] = 0.9
+    fhz, confidence = swe_frames.estimate_swe_rate(scores, swe_frames.swe_changes(scores), BMODE_FHZ)
+    assert abs(fhz - 1.5) < 0.05
+    assert confidence >= swe_frames.LOW_CONFIDENCE
+
+
+def test_no_rate_without_changes():
+    scores = np.zeros(59)
+    assert swe_frames.estimate_swe_rate(scores, swe_frames.swe_changes(scores), BMODE_FHZ) == (None, 0.0)
+
+
+def test_no_rate_for_changes_at_every_frame():
+    # noisy colours: every frame differs from the previous one
+    scores = np.random.default_rng(0).uniform(0.4, 0.5, 59)
+    indices = swe_frames.swe_changes(scores)
+    assert len(indices) == len(scores)
+    assert swe_frames.estimate_swe_rate(scores, indices, BMODE_FHZ) == (None, 0.0)
@@ -0,0 +1,62 @@
+import threading
+from pathlib import Path
+
+from swepy.app import tasks
+
+
+def run_queue(batch_queue):
+    """Start a batch queue and collect its events until all files are processed"""
+    batch_queue.start()
+    events = []
+    while True:
+        event = batch_queue.events.get(timeout=10)
+        if event is None:
+            return events
+        events.append(event)
+
+
+def final_status(events):
+    return {i: (status, detail) for i, status, detail in events}
+
+
+def prepare(path, progress):
+    progress(1, 1)
+    if path.stem == 'corrupt':
+        raise ValueError('not a DICOM file')
+    return path.stem
+
+
+def analyse(data, progress):
+    progress(1, 1)
+    return data.upper(), ['check SWE fhz'] if data == 'noisy' else []
+
+
+def test_batch_queue_status():
+    paths = [Path('a.dcm'), Path('corrupt.dcm'), Path('noisy.dcm')]
+    batch_queue = tasks.BatchQueue(paths, prepare, analyse)
+    status = final_status(run_queue(batch_queue))
+    assert status == {0: ('done', ''), 1: ('failed', 'ValueError: not a DICOM file'),
+                      2: ('done (check)', 'check SWE fhz')}
+    assert batch_queue.results == {0: 'A', 2: 'NOISY'}
+
+
+def test_batch_queue_cancel():
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_analyse(data, progress):
+        started.set()
+        release.wait(10)
+        progress(1, 1)  # raises once cancelled
+        return data, []
+
+    batch_queue = tasks.BatchQueue([Path('a.dcm'), Path('b.dcm')], prepare, slow_analyse)
+    batch_queue.start()
+    started.wait(10)
+    batch_queue.cancel()
+    release.set()
+    events = []
+    while (event := batch_queue.events.get(timeout=10)) is not None:
+        events.append(event)
+    assert final_status(events) == {0: ('cancelled', ''), 1: ('cancelled', '')}
+    assert batch_queue.results == {}